@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import threading
+import importlib
+import importlib.util
+from queue import Queue, Empty
+from time import perf_counter
+from subprocess import Popen, PIPE
+
+# generate levels headlessly from a manifest, over a pool of blender workers
+#
+# python batch_generate.py manifest.json [-j N] [--blender path] [--report report.json]
+#
+# manifest.json:
+# {"jobs": [{
+#     "name": "cave_01",
+#     "blend": "levels/cave_01.blend",   (paths are relative to the manifest)
+#     "output": "out/cave_01.blend",     (optional, default overwrites blend)
+#     "root": "Root",                    (optional, default active object)
+#     "tileset": "cave",                 (optional)
+#     "auto": true,                      (optional, AutoTurtle3D instead of ManualTurtle3D)
+#     "script": "generators/cave.py",    (defines generate(turtle, **params))
+#     "generator": "package.module:func", (instead of script)
+#     "params": {"seed": 1}
+# }]}
+
+RESULT_PREFIX = 'T3D_RESULT '
+USAGE = 'python batch_generate.py manifest.json [-j N] [--blender path] [--report report.json]'
+
+# ---- worker (runs inside blender) ----
+
+def load_generator(job):
+    if 'script' in job:
+        spec = importlib.util.spec_from_file_location('t3d_generator', job['script'])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return getattr(module, job.get('function', 'generate'))
+    module_name, func_name = job['generator'].split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+def set_tileset(prop, name):
+    for i, tileset in enumerate(prop.tilesets):
+        if tileset.tileset == name:
+            prop.tileset_idx = i
+            return
+    raise Exception('Tileset "{}" not found'.format(name))
+
+def run_job(job):
+    import bpy
+    from testudo3d.turtle3d import ManualTurtle3D, AutoTurtle3D
+    times = {}
+    start = perf_counter()
+    bpy.ops.wm.open_mainfile(filepath=job['blend'])
+    scene = bpy.context.scene
+    if job.get('root'):
+        scene.objects.active = bpy.data.objects[job['root']]
+    if job.get('tileset'):
+        scene.t3d_prop.refresh_tilesets()
+        set_tileset(scene.t3d_prop, job['tileset'])
+    times['load'] = perf_counter() - start
+
+    start = perf_counter()
+    turtle = AutoTurtle3D() if job.get('auto') else ManualTurtle3D()
+    t3d.init()
+    load_generator(job)(turtle, **job.get('params', {}))
+    t3d.on_quit()
+    times['generate'] = perf_counter() - start
+
+    # save next to the output and rename, so a crash never leaves half a level
+    start = perf_counter()
+    output = job.get('output') or job['blend']
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    tmp_path = output + '.tmp.blend'
+    bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True)
+    os.replace(tmp_path, output)
+    times['save'] = perf_counter() - start
+    return {'times': times, 'created': t3d.stats.created, 'deleted': t3d.stats.deleted}
+
+def main_worker():
+    # reads one job per line from stdin, answers with one result line each
+    import traceback
+    for line in sys.stdin:
+        job = json.loads(line)
+        start = perf_counter()
+        result = {'name': job['name']}
+        try:
+            result.update(run_job(job))
+            result['ok'] = True
+        except Exception:
+            result['ok'] = False
+            result['error'] = traceback.format_exc()
+        result['wall_time'] = perf_counter() - start
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+
+# ---- driver ----
+
+def load_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        jobs = json.load(f)['jobs']
+    for i, job in enumerate(jobs):
+        job.setdefault('name', 'job_{}'.format(i))
+        for key in ('blend', 'output', 'script'):
+            if job.get(key):
+                job[key] = os.path.normpath(os.path.join(base, job[key]))
+        if 'script' not in job and 'generator' not in job:
+            raise ValueError('{}: needs a script or generator'.format(job['name']))
+    return jobs
+
+class Worker(threading.Thread):
+    # feeds jobs to one blender process until the queue is empty
+    def __init__(self, blender, jobs, results):
+        threading.Thread.__init__(self)
+        self.args = [blender, '--background', '--python', os.path.abspath(__file__), '--', '--worker']
+        self.jobs = jobs
+        self.results = results
+        self.proc = None
+
+    def start_blender(self):
+        self.proc = Popen(self.args, stdin=PIPE, stdout=PIPE, universal_newlines=True, bufsize=1)
+
+    def run(self):
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except Empty:
+                break
+            if self.proc is None:
+                self.start_blender()
+            result = self.run_job(job)
+            self.results.append(result)
+            print('{:<24} {:<6} {:.2f}s'.format(result['name'], 'ok' if result['ok'] else 'FAILED', result['wall_time']))
+        if self.proc:
+            self.proc.stdin.close()
+            self.proc.wait()
+
+    def run_job(self, job):
+        start = perf_counter()
+        try:
+            self.proc.stdin.write(json.dumps(job) + '\n')
+            self.proc.stdin.flush()
+            for line in self.proc.stdout:
+                if line.startswith(RESULT_PREFIX):
+                    return json.loads(line[len(RESULT_PREFIX):])
+        except (OSError, ValueError):
+            pass
+        # blender died, start a new one for the next job
+        returncode = self.proc.wait()
+        self.proc = None
+        return {'name': job['name'], 'ok': False, 'wall_time': perf_counter() - start,
+                'error': 'blender exited with {}'.format(returncode)}
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument('manifest')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='number of blender workers')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'))
+    parser.add_argument('--report', help='write per-job results as JSON')
+    args = parser.parse_args()
+
+    jobs = Queue()
+    for job in load_manifest(args.manifest):
+        jobs.put(job)
+    results = []
+    start = perf_counter()
+    workers = [Worker(args.blender, jobs, results) for i in range(min(args.jobs, jobs.qsize()))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    total = perf_counter() - start
+
+    failed = [result for result in results if not result['ok']]
+    for result in failed:
+        print('{}:\n{}'.format(result['name'], result.get('error')))
+    print('{} jobs, {} failed, {:.2f}s'.format(len(results), len(failed), total))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'total_time': total, 'jobs': results}, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    # (same as test_script.py, blender's own args come before "--")
+    if '--' in sys.argv and '--worker' in sys.argv[sys.argv.index('--') + 1:]:
+        main_worker()
+    else:
+        main()
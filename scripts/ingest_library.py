@@ -0,0 +1,287 @@
+import os
+import sys
+import argparse
+import json
+import shutil
+import hashlib
+import tempfile
+from time import perf_counter
+from subprocess import Popen, call
+
+# turn a folder of OBJ models into a tile3d library .blend
+#
+# python ingest_library.py models_dir library.blend [-j N] [--blender path] [--tileset name]
+#
+# every model becomes a tile (a group named after the file, like Setup 3D Tiles)
+# tilesets are the model's folder (relative to models_dir), or --tileset
+# a cache next to the library (<library>.ingest.json) remembers content hashes,
+# so only new and changed models are imported again
+
+USAGE = 'python ingest_library.py models_dir library.blend [-j N] [--blender path] [--tileset name]'
+EXTENSION = '.obj'
+
+def tile_name(path):
+    # (no whitespace, same as setup tiles)
+    return os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+
+# ---- workers (run inside blender) ----
+
+def get_children(obj, children=None):
+    # recursive
+    if not children:
+        children = []
+    children += obj.children
+    for child in obj.children:
+        get_children(child, children)
+    return children
+
+def create_group(obj):
+    import bpy
+    group = bpy.data.groups.new(name=obj.name)
+    group.objects.link(obj)
+    for child in get_children(obj):
+        group.objects.link(child)
+    group.dupli_offset = obj.location
+    return group
+
+def save_atomic(path):
+    import bpy
+    tmp_path = path + '.tmp.blend'
+    bpy.ops.wm.save_as_mainfile(filepath=tmp_path, copy=True)
+    os.replace(tmp_path, path)
+
+def import_worker(job):
+    # import some models into an empty file, one tile each
+    import bpy
+    scene = bpy.context.scene
+    for obj in list(scene.objects):
+        bpy.data.objects.remove(obj, True)
+    results = {}
+    for model in job['models']:
+        start = perf_counter()
+        before = set(scene.objects)
+        bpy.ops.import_scene.obj(filepath=model['path'], use_split_objects=False, split_mode='OFF')
+        imported = [obj for obj in scene.objects if obj not in before]
+        top = [obj for obj in imported if not obj.parent]
+        if len(top) != 1:
+            # several top-level objects, parent them to an empty (the tile)
+            empty = bpy.data.objects.new(model['tile'], None)
+            empty.empty_draw_size = 0
+            scene.objects.link(empty)
+            for obj in top:
+                obj.parent = empty
+            tile = empty
+        else:
+            tile = top[0]
+        tile.name = model['tile']
+        tile.name = model['tile'] # insist
+        tile['tileset'] = model['tileset'] # (Object.tileset, without needing the add-on)
+        create_group(tile)
+        results[model['rel']] = {'tile': tile.name, 'time': perf_counter() - start}
+    save_atomic(job['out'])
+    with open(job['results'], 'w') as f:
+        json.dump(results, f)
+
+def merge_worker(job):
+    # replace changed tiles in the library with the ones from the parts
+    import bpy
+    if os.path.exists(job['library']):
+        bpy.ops.wm.open_mainfile(filepath=job['library'])
+    else:
+        for obj in list(bpy.context.scene.objects):
+            bpy.data.objects.remove(obj, True)
+    scene = bpy.context.scene
+    for name in job['remove']:
+        group = bpy.data.groups.get(name)
+        if group is None: continue
+        for obj in list(group.objects):
+            bpy.data.objects.remove(obj, True)
+        bpy.data.groups.remove(group)
+    # the names the groups actually got
+    # (blender appends Name.001 if the library already has a Name the cache doesn't know about)
+    names = {}
+    for part, tiles in job['parts'].items():
+        with bpy.data.libraries.load(part, link=False) as (data_src, data_dst):
+            data_dst.groups = tiles
+        for tile, group in zip(tiles, data_dst.groups):
+            names[tile] = group.name
+            for obj in group.objects:
+                scene.objects.link(obj)
+    layout_tiles()
+    save_atomic(job['library'])
+    with open(job['results'], 'w') as f:
+        json.dump(names, f)
+
+def layout_tiles():
+    # lay every ingested tile out on a grid, the same as Setup 3D Tiles (Layout In Grid)
+    import bpy
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+    from testudo3d import layout_in_grid
+    tiles = []
+    for group in bpy.data.groups:
+        if group.library or group.name not in group.objects: continue
+        obj = group.objects[group.name]
+        if obj.get('tileset'):
+            tiles.append((obj, group))
+    tiles.sort(key=lambda tile: tile[0].name)
+    layout_in_grid([obj for obj, group in tiles])
+    for obj, group in tiles:
+        group.dupli_offset = obj.location # (so instances don't move)
+
+def main_worker(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--import', dest='import_job')
+    parser.add_argument('--merge', dest='merge_job')
+    args = parser.parse_args(argv)
+    if args.import_job:
+        with open(args.import_job) as f:
+            import_worker(json.load(f))
+    if args.merge_job:
+        with open(args.merge_job) as f:
+            merge_worker(json.load(f))
+
+# ---- driver ----
+
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    # materials live next to the obj
+    mtl = os.path.splitext(path)[0] + '.mtl'
+    if os.path.exists(mtl):
+        with open(mtl, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+def find_models(models_dir, tileset=None):
+    # {relative path: model}
+    models = {}
+    models_dir = os.path.abspath(models_dir)
+    for dirpath, dirnames, filenames in os.walk(models_dir):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.lower().endswith(EXTENSION): continue
+            path = os.path.join(dirpath, filename)
+            rel = os.path.relpath(path, models_dir).replace(os.sep, '/')
+            folder = os.path.dirname(rel)
+            models[rel] = {
+                'rel': rel,
+                'path': path,
+                'tile': tile_name(path),
+                'tileset': tileset or folder.replace('/', '_') or 'default'
+            }
+    return models
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def positive_int(value):
+    value = int(value)
+    if value < 1:
+        raise argparse.ArgumentTypeError('must be at least 1')
+    return value
+
+def blender_args(blender, *args):
+    return [blender, '--background', '--factory-startup', '--python', os.path.abspath(__file__), '--'] + list(args)
+
+def main():
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument('models_dir')
+    parser.add_argument('library')
+    parser.add_argument('-j', '--jobs', type=positive_int, default=os.cpu_count() or 1, help='number of blender workers')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER', 'blender'))
+    parser.add_argument('--tileset', help='put every tile in this tileset (default: the folder name)')
+    args = parser.parse_args()
+
+    library = os.path.abspath(args.library)
+    cache_path = library + '.ingest.json'
+    cache = load_cache(cache_path) if os.path.exists(library) else {}
+    start = perf_counter()
+
+    models = find_models(args.models_dir, args.tileset)
+    tiles = {}
+    for rel, model in sorted(models.items()):
+        if model['tile'] in tiles:
+            parser.error('{} and {} would both be tile "{}" (tile names must be unique)'.format(
+                tiles[model['tile']], rel, model['tile']))
+        tiles[model['tile']] = rel
+        model['hash'] = file_hash(model['path'])
+
+    changed = [model for rel, model in sorted(models.items())
+               if rel not in cache or cache[rel]['hash'] != model['hash'] or cache[rel]['tileset'] != model['tileset']]
+    removed = [rel for rel in cache if rel not in models]
+    print('{} models: {} new or changed, {} removed, {} unchanged'.format(
+        len(models), len(changed), len(removed), len(models) - len(changed)))
+    if not changed and not removed:
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix='t3d_ingest_')
+    try:
+        # import
+        chunks = [changed[i::args.jobs] for i in range(args.jobs)]
+        procs = []
+        for i, chunk in enumerate(chunk for chunk in chunks if chunk):
+            job = {
+                'models': chunk,
+                'out': os.path.join(tmp_dir, 'part_{}.blend'.format(i)),
+                'results': os.path.join(tmp_dir, 'part_{}.json'.format(i))
+            }
+            job_path = os.path.join(tmp_dir, 'import_{}.json'.format(i))
+            write_json(job_path, job)
+            procs.append((Popen(blender_args(args.blender, '--import', job_path)), job))
+        parts = {}
+        imported = {}
+        for proc, job in procs:
+            proc.wait()
+            try:
+                with open(job['results']) as f:
+                    results = json.load(f)
+            except (OSError, ValueError):
+                sys.exit('import failed for: ' + ', '.join(model['rel'] for model in job['models']))
+            parts[job['out']] = [result['tile'] for result in results.values()]
+            imported.update(results)
+
+        # merge
+        remove = [cache[rel]['tile'] for rel in removed]
+        remove += [cache[model['rel']]['tile'] for model in changed if model['rel'] in cache]
+        job_path = os.path.join(tmp_dir, 'merge.json')
+        results_path = os.path.join(tmp_dir, 'merge_results.json')
+        write_json(job_path, {'library': library, 'remove': remove, 'parts': parts, 'results': results_path})
+        if call(blender_args(args.blender, '--merge', job_path)) != 0 or not os.path.exists(library):
+            sys.exit('merge failed')
+        try:
+            with open(results_path) as f:
+                merged = json.load(f)
+        except (OSError, ValueError):
+            sys.exit('merge failed')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for rel in removed:
+        del cache[rel]
+    for model in changed:
+        tile = merged[imported[model['rel']]['tile']]
+        if tile != model['tile']:
+            print('warning: {} is "{}" in the library (it already had a "{}")'.format(model['rel'], tile, model['tile']))
+        cache[model['rel']] = {'hash': model['hash'], 'tileset': model['tileset'], 'tile': tile}
+    write_json(cache_path, cache)
+    import_time = sum(result['time'] for result in imported.values())
+    print('done in {:.2f}s ({:.2f}s importing, over {} workers)'.format(
+        perf_counter() - start, import_time, len(procs)))
+
+if __name__ == '__main__':
+    if '--' in sys.argv:
+        main_worker(sys.argv[sys.argv.index('--') + 1:])
+    else:
+        main()
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+from time import perf_counter
+from subprocess import call
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # (blender doesn't add it)
+from test_script import T3DTest, TurtleTest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(TEST_DIR, os.pardir, 'results')
+# (not shipped, timings are per machine: record them with --update-baselines)
+BASELINES_PATH = os.path.join(TEST_DIR, 'benchmark_baselines.json')
+DEFAULT_TOLERANCE = 1.25 # fail if this much slower than the baseline
+# NOTE: requires blender in PATH (or --blender)
+USAGE = 'python benchmark.py [benchmark_name ...] [--blender path] [--update-baselines]'
+
+def peak_memory_mb():
+    try:
+        import resource
+    except ImportError:
+        return None # windows
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxrss / 1024 / 1024 # bytes
+    return maxrss / 1024 # kilobytes
+
+class Benchmark:
+    # setup() isn't timed, execute() is
+    name = None
+    auto = False # needs a tileset with rules
+
+    def test_init(self):
+        import logging
+        from testudo3d.turtle3d import ManualTurtle3D, AutoTurtle3D
+        if self.auto:
+            prop = get_prop()
+            for i, tileset in enumerate(prop.tilesets):
+                if tileset.rules:
+                    prop.tileset_idx = i
+                    break
+            else:
+                raise SkipBenchmark('no tileset with rules')
+            self.turtle = AutoTurtle3D(logging_level=logging.WARNING)
+        else:
+            self.turtle = ManualTurtle3D(logging_level=logging.WARNING)
+        t3d.init()
+
+    def setup(self):
+        pass
+
+    def run_benchmark(self):
+        result = {'name': self.name}
+        try:
+            self.test_init()
+            self.setup()
+        except SkipBenchmark as e:
+            result['skipped'] = str(e)
+            return result
+        t3d.stats.begin_stroke()
+        rebuilds = t3d.stats.finder_rebuilds
+        start = perf_counter()
+        self.execute()
+        result['wall_time'] = perf_counter() - start
+        stats = t3d.stats
+        result['stats'] = {
+            'created': stats.created,
+            'deleted': stats.deleted,
+            'repaints': stats.repaints,
+            'finder_rebuilds': stats.finder_rebuilds - rebuilds
+        }
+        result['peak_memory_mb'] = peak_memory_mb()
+        return result
+
+class SkipBenchmark(Exception):
+    pass
+
+def get_prop():
+    import bpy
+    return bpy.context.scene.t3d_prop
+
+def fill_box(turtle, w, d):
+    turtle.start_select()
+    turtle.translate(w-1, d-1, 0)
+    turtle.fill()
+    turtle.translate(-(w-1), -(d-1), 0)
+
+class CircfillBenchmark(Benchmark, T3DTest):
+    name = 'circfill_64'
+
+    def setup(self):
+        self.turtle.settile('Suzanne')
+        self.turtle.down()
+
+    def execute(self):
+        self.turtle.circfill(64)
+
+class BoxFillBenchmark(Benchmark, T3DTest):
+    name = 'box_fill_100'
+
+    def setup(self):
+        self.turtle.settile('Suzanne')
+
+    def execute(self):
+        fill_box(self.turtle, 100, 100)
+
+class AutotileBenchmark(Benchmark, T3DTest):
+    name = 'autotile_region_32'
+    auto = True
+
+    def execute(self):
+        fill_box(self.turtle, 32, 32)
+
+class GrabBenchmark(Benchmark, T3DTest):
+    name = 'grab_10k'
+
+    def setup(self):
+        self.turtle.settile('Suzanne')
+        fill_box(self.turtle, 100, 100)
+
+    def execute(self):
+        turtle = self.turtle
+        turtle.start_select()
+        turtle.translate(99, 99, 0)
+        turtle.start_grab()
+        turtle.translate(0, 120, 0)
+        turtle.rotate(90)
+        turtle.end_grab()
+
+class PasteBenchmark(Benchmark, T3DTest):
+    name = 'paste_50'
+
+    def setup(self):
+        turtle = self.turtle
+        turtle.settile('Suzanne')
+        fill_box(turtle, 50, 50)
+        turtle.start_select()
+        turtle.translate(49, 49, 0)
+        turtle.copy()
+        turtle.translate(-49, 10, 0)
+
+    def execute(self):
+        self.turtle.paste()
+
+class LsysBenchmark(Benchmark, TurtleTest):
+    depth = None
+
+    def setup(self):
+        self.turtle.settile('Suzanne')
+
+    def execute(self):
+        # Weed-1 (see TurtleTest)
+        self.lsys(depth=self.depth, length=7.5, angle=25, axiom='f', rules={'f':'f[-f]f[+f]f'})
+
+class FinderBenchmark(Benchmark, T3DTest):
+    count = None
+
+    def setup(self):
+        # a square of count tiles
+        side = int(self.count ** 0.5)
+        for i in range(self.count):
+            t3d.create_tile('Suzanne', pos=(i % side, i // side, 0))
+
+    def execute(self):
+        t3d.finder.rebuild()
+
+for depth in (1, 2, 3, 4):
+    name = 'lsys_depth_{}'.format(depth)
+    globals()[name] = type(name, (LsysBenchmark,), {'name': name, 'depth': depth})
+
+for count in (1000, 10000, 100000):
+    name = 'finder_rebuild_{}'.format(count)
+    globals()[name] = type(name, (FinderBenchmark,), {'name': name, 'count': count})
+
+def get_benchmarks():
+    benchmarks = {}
+    classes = list(Benchmark.__subclasses__())
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        if cls.name:
+            benchmarks[cls.name] = cls
+    return benchmarks
+
+def load_baselines():
+    try:
+        with open(BASELINES_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def compare(result, baseline):
+    # sets result['status'] to pass, fail, skipped or no baseline
+    if 'skipped' in result:
+        result['status'] = 'skipped'
+    elif 'error' in result:
+        result['status'] = 'fail'
+    elif not baseline:
+        result['status'] = 'no baseline'
+    else:
+        limit = baseline['wall_time'] * baseline.get('tolerance', DEFAULT_TOLERANCE)
+        result['baseline'] = baseline['wall_time']
+        result['status'] = 'pass' if result['wall_time'] <= limit else 'fail'
+    return result['status']
+
+def run_in_blender(blender, name, out_path):
+    # one blender process per benchmark, so peak memory is per benchmark
+    args = [blender, '--background', os.path.join(TEST_DIR, 'test.blend'),
+            '--python', os.path.abspath(__file__), '--', '--bench', name, '--out', out_path]
+    if os.path.exists(out_path):
+        os.remove(out_path) # don't read a stale result if blender crashes
+    returncode = call(args)
+    try:
+        with open(out_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'name': name, 'error': 'blender exited with {}'.format(returncode)}
+
+def main_blender(argv):
+    # inside blender
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bench', required=True)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args(argv)
+    result = get_benchmarks()[args.bench]().run_benchmark()
+    with open(args.out, 'w') as f:
+        json.dump(result, f)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default all)')
+    parser.add_argument('--blender', default='blender')
+    parser.add_argument('--out', default=os.path.join(RESULTS_DIR, 'benchmark.json'))
+    parser.add_argument('--update-baselines', action='store_true',
+                        help='store these results as the new baselines')
+    args = parser.parse_args()
+
+    benchmarks = get_benchmarks()
+    names = args.names or sorted(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            parser.error('{} is not a benchmark'.format(name))
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+    baselines = load_baselines()
+    results = []
+    for name in names:
+        out_path = os.path.join(RESULTS_DIR, name + '.json')
+        result = run_in_blender(args.blender, name, out_path)
+        status = compare(result, baselines.get(name))
+        print('{:<24} {:<12} {}'.format(name, status, '{:.3f}s'.format(result['wall_time']) if 'wall_time' in result else ''))
+        results.append(result)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.update_baselines:
+        for result in results:
+            if 'wall_time' not in result: continue
+            baseline = baselines.setdefault(result['name'], {})
+            baseline['wall_time'] = result['wall_time']
+        with open(BASELINES_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+
+    failed = [result['name'] for result in results if result['status'] == 'fail']
+    if failed:
+        print('FAILED: ' + ', '.join(failed))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    if '--' in sys.argv:
+        main_blender(sys.argv[sys.argv.index('--') + 1:])
+    else:
+        main()
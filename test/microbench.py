@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import random
+import statistics
+import importlib.util
+from time import perf_counter
+
+# microbenchmarks for the pure python kernels (grid.py, rules.py)
+# runs under plain python, no blender needed
+# python microbench.py [filter ...] [--repeats N] [--warmups N] [--out results.json]
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'testudo3d')
+MIN_TIME = 0.05 # seconds per repeat, loops are calibrated to at least this
+
+def load(name):
+    # by path, so testudo3d/__init__.py (and bpy) isn't imported
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PACKAGE_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+grid = load('grid')
+rules = load('rules')
+
+def calibrate(func):
+    loops = 1
+    while True:
+        start = perf_counter()
+        for i in range(loops):
+            func()
+        if perf_counter() - start >= MIN_TIME:
+            return loops
+        loops *= 2
+
+def bench(func, repeats, warmups):
+    # returns seconds per call for each repeat
+    loops = calibrate(func)
+    for i in range(warmups):
+        for j in range(loops):
+            func()
+    times = []
+    for i in range(repeats):
+        start = perf_counter()
+        for j in range(loops):
+            func()
+        times.append((perf_counter() - start) / loops)
+    return times
+
+def make_rules_text(count):
+    lines = ['# generated', 'default floor*']
+    for i in range(count):
+        lines.append('{} wall{:03d} pillar*'.format(format(i % 64, '06b'), i))
+    return lines
+
+def get_cases():
+    cases = []
+    for r in (4, 16, 64, 256):
+        cases.append(('circle_points r={}'.format(r), lambda r=r: list(grid.circle_points(r, 0, 0, 0))))
+        cases.append(('circfill_points r={}'.format(r), lambda r=r: list(grid.circfill_points(0, 0, r, 0))))
+        # uncached kernels, brush_offsets caches these
+        cases.append(('circle_offsets r={}'.format(r), lambda r=r: grid.circle_offsets(r)))
+        cases.append(('circfill_offsets r={}'.format(r), lambda r=r: grid.circfill_offsets(r)))
+    cases.append(('plot4', lambda: list(grid.plot4(0, 0, 3, 4, 0))))
+    for n in (10, 100, 1000):
+        cases.append(('line_points len={}'.format(n), lambda n=n: list(grid.line_points(0, n, 0, n // 3, 0))))
+        cases.append(('line_points_3d len={}'.format(n), lambda n=n: list(grid.line_points_3d(0, 0, 0, n, n // 3, n // 7))))
+    group_names = ['floor{}'.format(i) for i in range(20)] + ['pillar{}'.format(i) for i in range(20)]
+    for n in (10, 100, 1000):
+        lines = make_rules_text(n)
+        cases.append(('parse_rules lines={}'.format(n), lambda lines=lines: rules.parse_rules(lines, group_names)))
+    random.seed(0)
+    neighbours = [[random.random() < 0.5 for i in range(6)] for j in range(1000)]
+    cases.append(('get_bitmask x1000', lambda: [rules.get_bitmask(adjacent) for adjacent in neighbours]))
+    return cases
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '{:.2f}{}'.format(seconds * scale, unit)
+    return '{:.0f}ns'.format(seconds * 1e9)
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('filters', nargs='*', help='only run cases containing one of these')
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--warmups', type=int, default=2)
+    parser.add_argument('--out', help='write results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for name, func in get_cases():
+        if args.filters and not any(f in name for f in args.filters): continue
+        times = bench(func, args.repeats, args.warmups)
+        result = {
+            'name': name,
+            'min': min(times),
+            'median': statistics.median(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0
+        }
+        print('{:<28} min {:>10}  median {:>10}  +- {}'.format(
+            name, format_time(result['min']), format_time(result['median']), format_time(result['stdev'])))
+        results.append(result)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
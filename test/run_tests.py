@@ -1,21 +1,69 @@
-
 from test_script import *
+from subprocess import Popen
+import shutil
+import tempfile
 import unittest
 
+# fan the tests out over this many blender processes (each runs several tests)
+JOBS = int(os.environ.get('T3D_TEST_JOBS', os.cpu_count() or 1))
+
+def run_parallel(names, jobs=JOBS):
+    # returns {test name: result}
+    chunks = [names[i::jobs] for i in range(jobs)]
+    chunks = [chunk for chunk in chunks if chunk]
+    tmp_dir = tempfile.mkdtemp(prefix='t3d_tests_')
+    try:
+        procs = []
+        for i, chunk in enumerate(chunks):
+            out_path = os.path.join(tmp_dir, 'results_{}.json'.format(i))
+            procs.append((Popen(blender_command(chunk, out_path)), chunk, out_path))
+        results = {}
+        for proc, chunk, out_path in procs:
+            returncode = proc.wait()
+            try:
+                with open(out_path) as f:
+                    for result in json.load(f):
+                        results[result['name']] = result
+            except (OSError, ValueError):
+                pass
+            for name in chunk:
+                if name not in results:
+                    # blender crashed before writing results
+                    results[name] = {'name': name, 'passed': False,
+                                     'error': 'blender exited with {}'.format(returncode)}
+        return results
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
 class T3DUnitTests(unittest.TestCase):
     # basic functional tests
-    def circle_test(self):
-        CircleTest().run_in_blender()
+    results = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run_parallel(sorted(get_tests()))
+
+    def check(self, name):
+        result = self.results[name]
+        self.assertTrue(result['passed'], result.get('error'))
 
-    def combined_test(self):
-        CombinedTest().run_in_blender()
+    def test_circle(self):
+        self.check(CircleTest.name)
 
-    def turtle_test(self):
-        TurtleTest().run_in_blender()
+    def test_combined(self):
+        self.check(CombinedTest.name)
 
-    def cellular_automata_test(self):
-        CellularAutomataTest().run_in_blender()
+    def test_turtle(self):
+        self.check(TurtleTest.name)
+
+    def test_cellular_automata(self):
+        self.check(CellularAutomataTest.name)
+
+    def test_flood_fill(self):
+        self.check(FloodFillTest.name)
+
+    def test_running_modal(self):
+        self.check(RunningModalTest.name)
 
 if __name__ == '__main__':
     unittest.main()
-
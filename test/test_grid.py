@@ -0,0 +1,84 @@
+import os
+import unittest
+import importlib.util
+
+# pure python, no blender needed (python -m pytest test/test_grid.py)
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'testudo3d')
+
+def load(name):
+    # by path, so testudo3d/__init__.py (and bpy) isn't imported
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PACKAGE_DIR, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+grid = load('grid')
+Cell = grid.Cell
+
+def ring(size):
+    # the outline of a size x size square at z=0
+    cells = set()
+    for i in range(size):
+        cells.update((Cell(i, 0, 0), Cell(i, size - 1, 0), Cell(0, i, 0), Cell(size - 1, i, 0)))
+    return cells
+
+class CellTests(unittest.TestCase):
+    def test_add_cell(self):
+        self.assertEqual(Cell(1, 2, 3) + Cell(1, 1, 1), Cell(2, 3, 4))
+        self.assertEqual(Cell(1, 2, 3) - Cell(1, 1, 1), Cell(0, 1, 2))
+
+    def test_floats_are_rounded(self):
+        for cell in (Cell(0, 0, 0) + (1.0, 2.4, -0.6),
+                     (1.0, 2.4, -0.6) + Cell(0, 0, 0),
+                     Cell(2, 3, 0) - (1.0, 0.6, 1.4),
+                     (3.0, 3.6, 1.4) - Cell(2, 0, 2)):
+            self.assertTrue(all(type(v) is int for v in cell), cell)
+        self.assertEqual(Cell(0, 0, 0) + (1.0, 2.4, -0.6), Cell(1, 2, -1))
+
+class FloodTests(unittest.TestCase):
+    def test_enclosed(self):
+        walls = ring(5)
+        cells = grid.flood(Cell(2, 2, 0), lambda c: c not in walls, grid.ADJACENCY_2D,
+                           Cell(0, 0, 0), Cell(4, 4, 0), 10000)
+        self.assertEqual(len(cells), 9)
+        self.assertFalse(walls & set(cells))
+
+    def test_escaping(self):
+        # a gap in the ring
+        walls = ring(5) - {Cell(2, 0, 0)}
+        cells = grid.flood(Cell(2, 2, 0), lambda c: c not in walls, grid.ADJACENCY_2D,
+                           Cell(0, 0, 0), Cell(4, 4, 0), 10000)
+        self.assertIsNone(cells)
+
+    def test_bounds_as_walls(self):
+        # open space, the box is the wall
+        cells = grid.flood(Cell(2, 2, 0), lambda c: True, grid.ADJACENCY_2D,
+                           Cell(0, 0, 0), Cell(4, 4, 0), 10000, walls=True)
+        self.assertEqual(set(cells), set(grid.iter_region(Cell(0, 0, 0), Cell(4, 4, 0))))
+
+    def test_bounds_as_walls_3d(self):
+        cells = grid.flood(Cell(0, 0, 0), lambda c: True, grid.ADJACENCY,
+                           Cell(-1, -1, -1), Cell(1, 1, 1), 10000, walls=True)
+        self.assertEqual(len(cells), 27)
+
+    def test_limit(self):
+        with self.assertRaises(grid.FloodLimitError):
+            grid.flood(Cell(0, 0, 0), lambda c: True, grid.ADJACENCY_2D, limit=100)
+
+    def test_limit_not_reached(self):
+        walls = ring(5)
+        cells = grid.flood(Cell(2, 2, 0), lambda c: c not in walls, grid.ADJACENCY_2D, limit=9)
+        self.assertEqual(len(cells), 9)
+
+    def test_start_not_passable(self):
+        self.assertEqual(grid.flood(Cell(0, 0, 0), lambda c: False), [])
+
+    def test_connected(self):
+        # select connected: flood over occupied cells, unbounded
+        occupied = ring(5) | {Cell(10, 10, 0)}
+        cells = grid.flood(Cell(0, 0, 0), occupied.__contains__, grid.ADJACENCY_2D, limit=10000)
+        self.assertEqual(set(cells), ring(5))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,25 @@
 
 from subprocess import call
+from time import perf_counter
 import os
 import sys
+import json
+import traceback
 
 tests = {}
-RESULTS_DIR = r"..\results"
-# NOTE: requires blender in PATH
-COMMAND ='blender --background test.blend --python test_script.py -- --test {}'
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(TEST_DIR, os.pardir, 'results')
+TEST_BLEND = os.path.join(TEST_DIR, 'test.blend')
+# NOTE: requires blender in PATH (or set BLENDER)
+BLENDER = os.environ.get('BLENDER', 'blender')
+USAGE = 'blender --background test.blend --python test_script.py -- (--test [test_name ...] | --all) [--out results.json]'
+
+def blender_command(test_names, out_path=None):
+    args = [BLENDER, '--background', TEST_BLEND, '--python', os.path.join(TEST_DIR, 'test_script.py'),
+            '--', '--test'] + list(test_names)
+    if out_path:
+        args += ['--out', out_path]
+    return args
 
 class T3DTest:
     name = None
@@ -14,7 +27,7 @@ class T3DTest:
 
     def run_in_blender(self):
         # invokes blender from command line, with itself as parameter
-        call(COMMAND.format(self.name), shell=True)
+        call(blender_command([self.name]))
 
     def run(self):
         # run
@@ -241,9 +254,74 @@ class CellularAutomataTest(T3DTest):
                     turtle.goto(x, t+1)
                     turtle.paint()
 
+class FloodFillTest(T3DTest):
+    name = "flood_fill_test"
+
+    def execute(self):
+        turtle = self.turtle
+        turtle.settile('Suzanne')
+        # a 5x5 ring
+        for i in range(5):
+            for x, y in ((i, 0), (i, 4), (0, i), (4, i)):
+                turtle.goto(x, y)
+                turtle.paint()
+        turtle.goto(2, 2)
+        assert turtle.floodfill() == 9
+        t3d.finder.invalidate()
+        turtle.goto(0, 0)
+        assert t3d.select_connected() == 25
+        # open space, bounded by the selection
+        turtle.goto(10, 0)
+        turtle.start_select()
+        turtle.goto(12, 2)
+        assert turtle.floodfill() == 9
+        t3d.state.select = False
+        # not enclosed
+        turtle.goto(20, 20)
+        assert turtle.floodfill() == 0
+
+class RunningModalTest(T3DTest):
+    name = "running_modal_test"
+
+    def execute(self):
+        # the panels ask running_modal() on every draw, once the engine is loaded too
+        import testudo3d
+        operator = testudo3d.load_engine()
+        assert not testudo3d.running_modal()
+        operator.T3DOperatorBase.running_modal = True
+        try:
+            assert testudo3d.running_modal()
+        finally:
+            operator.T3DOperatorBase.running_modal = False
+
 def get_tests():
-    global tests
-    tests = { cls.name: cls for cls in T3DTest.__subclasses__() }
+    tests.clear()
+    tests.update({ cls.name: cls for cls in T3DTest.__subclasses__() })
+    return tests
+
+def reset_scene():
+    # reload test.blend, much cheaper than starting blender again
+    import bpy
+    bpy.ops.wm.open_mainfile(filepath=TEST_BLEND)
+
+def run_tests(names):
+    # runs each test in this blender process, returns a result for each
+    results = []
+    for i, name in enumerate(names):
+        if i: reset_scene()
+        result = {'name': name}
+        start = perf_counter()
+        try:
+            tests[name]().run()
+            result['passed'] = True
+        except Exception:
+            result['passed'] = False
+            result['error'] = traceback.format_exc()
+            print(result['error'])
+        result['wall_time'] = perf_counter() - start
+        results.append(result)
+        print('{} {} ({:.2f}s)'.format(name, 'passed' if result['passed'] else 'FAILED', result['wall_time']))
+    return results
 
 def parse_args():
     import argparse
@@ -253,28 +331,35 @@ def parse_args():
         argv = []
     else:
         argv = argv[argv.index("--") + 1:]  # get all args after "--"
-    parser = argparse.ArgumentParser(description=COMMAND.format("[test_name]"))
-    parser.add_argument("-t", "--test", dest="test_name", type=str, required=True,
-                        help="name of test to run")
+    parser = argparse.ArgumentParser(usage=USAGE)
+    parser.add_argument("-t", "--test", dest="test_names", nargs='+', default=[],
+                        help="names of tests to run")
+    parser.add_argument("-a", "--all", action='store_true', help="run all tests")
+    parser.add_argument("-o", "--out", help="write results to this JSON file")
     args = parser.parse_args(argv)
     if not argv:
         parser.print_help()
         return
-    if not args.test_name:
-        print("Error: --test [test_name] argument not given, aborting.")
+    if args.all:
+        args.test_names = sorted(tests)
+    if not args.test_names:
+        print("Error: --test [test_name ...] or --all not given, aborting.")
         parser.print_help()
         return
-    if args.test_name not in tests:
-        print("Error: --test {} is not a test".format(args.test_name))
-        return
+    for name in args.test_names:
+        if name not in tests:
+            print("Error: --test {} is not a test".format(name))
+            return
     return args
 
 def main():
     get_tests()
     args = parse_args()
     if not args: return
-    cls = tests[args.test_name]
-    cls().run()
+    results = run_tests(args.test_names)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
     print("tests finished, exiting")
 
 if __name__ == "__main__":
@@ -29,9 +29,13 @@ bl_info = {
     "category": "3D View",
 }
 
+import sys
 import logging
+from time import perf_counter
+_import_start = perf_counter()
 from os.path import splitext, basename, dirname, join
 import bpy
+import bmesh
 from math import ceil, sqrt, radians, degrees
 from bpy.props import (
     StringProperty,
@@ -50,31 +54,106 @@ from bpy.types import (
     Header,
     UIList
 )
-from mathutils import Vector
+from mathutils import Vector, Matrix
 
-from .tilemap3d import init_object_props, update_3dviews, get_first_group_name, get_tileset_from_group, round_vector, roundbase
-from .turtle3d import Turtle3D
-from .autotiler3d import AutoTiler3D
-from .operator import T3DOperatorBase, ManualModeOperator, AutoModeOperator, clamp
+# the engine (tilemap3d, autotiler3d, operator...) is imported on first use, see load_engine()
+from .utils import init_object_props, get_tile_cell, update_3dviews, get_first_group_name, get_tileset_from_group, round_vector, roundbase, clamp
+from .grid import Cell, chunk_of
 from .events import subscribe, unsubscribe, send_event
+from .registry import registry
+from . import previews
+from . import library
+from . import trace
+from .trace import traced
 
 addon_keymaps = []
 
-def make_linked_duplicate(src):
+# seconds. enabling t3d shouldn't slow down blender sessions that don't use it
+REGISTER_BUDGET = 0.05
+
+def running_modal():
+    # (without importing the engine if it hasn't been used yet)
+    operator = sys.modules.get(__package__ + '.operator')
+    return operator is not None and operator.T3DOperatorBase.running_modal
+
+def load_engine():
+    from . import operator
+    for cls in (operator.ManualModeOperator, operator.AutoModeOperator):
+        if not cls.is_registered:
+            bpy.utils.register_class(cls)
+    return operator
+
+def unload_engine():
+    operator = sys.modules.get(__package__ + '.operator')
+    if operator is None: return
+    for cls in (operator.ManualModeOperator, operator.AutoModeOperator):
+        if cls.is_registered:
+            bpy.utils.unregister_class(cls)
+
+def make_linked_duplicate(src, scene=None):
+    # shares src's data (mesh etc.), like alt+d
     obj = src.copy()
-    if src.data:
-        obj.data = src.data.copy()
-    bpy.context.scene.objects.link(obj)
+    (scene or bpy.context.scene).objects.link(obj)
     return obj
 
-def create_group_instance(group_name):
+def join_meshes(name, parts, scene, only_material=False, material=None):
+    # one mesh object from (mesh, matrix_world) parts (in world space)
+    # with only_material, only the faces using material are kept
+    bm = bmesh.new()
+    materials = []
+    for mesh, matrix_world in parts:
+        remap = []
+        for slot_material in mesh.materials:
+            if slot_material not in materials:
+                materials.append(slot_material)
+            remap.append(materials.index(slot_material))
+        num_verts = len(bm.verts)
+        num_faces = len(bm.faces)
+        bm.from_mesh(mesh) # (appends)
+        bm.verts.ensure_lookup_table()
+        bm.faces.ensure_lookup_table()
+        bmesh.ops.transform(bm, matrix=matrix_world, verts=bm.verts[num_verts:])
+        if only_material:
+            slots = list(mesh.materials) or [None]
+            other = [face for face in bm.faces[num_faces:]
+                     if slots[min(face.material_index, len(slots) - 1)] != material]
+            bmesh.ops.delete(bm, geom=other, context=5) # DEL_FACES, (and the verts only they used)
+        elif remap:
+            for face in bm.faces[num_faces:]:
+                face.material_index = remap[min(face.material_index, len(remap) - 1)]
+    if only_material:
+        for face in bm.faces:
+            face.material_index = 0
+        materials = [material]
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+    for slot_material in materials:
+        mesh.materials.append(slot_material)
+    obj = bpy.data.objects.new(name, mesh)
+    scene.objects.link(obj)
+    return obj
+
+def get_mesh_materials(mesh):
+    # the materials the faces actually use
+    slots = list(mesh.materials) or [None]
+    indices = {min(poly.material_index, len(slots) - 1) for poly in mesh.polygons}
+    return {slots[i] for i in indices}
+
+def can_join(obj):
+    # modifiers and object-linked materials would be lost by joining the mesh data
+    if obj.type != 'MESH': return False
+    if len(obj.modifiers): return False
+    return not any(slot.link == 'OBJECT' for slot in obj.material_slots)
+
+def create_group_instance(group_name, scene=None):
+    # bpy.data rather than bpy.ops.object.empty_add (no scene update per object)
     group = bpy.data.groups[group_name]
-    bpy.ops.object.empty_add()
-    empty = bpy.context.object
-    empty.name = group_name
+    empty = bpy.data.objects.new(group_name, None)
     empty.empty_draw_size = 0 # don't like everything looking hairy
     empty.dupli_type = 'GROUP'
     empty.dupli_group = group
+    (scene or bpy.context.scene).objects.link(empty)
     return empty
 
 def get_children(obj, children=None):
@@ -86,10 +165,43 @@ def get_children(obj, children=None):
         get_children(child, children)
     return children
 
+def create_tile_group(obj):
+    # put obj and its children in a group of the same name, so it can be duplicated
+    children = get_children(obj)
+    if obj.name in bpy.data.groups:
+        # reuse
+        group = bpy.data.groups[obj.name]
+        for object in list(group.objects):
+            group.objects.unlink(object)
+    else:
+        group = bpy.data.groups.new(name=obj.name)
+    group.objects.link(obj)
+    for child in children:
+        group.objects.link(child)
+    group.dupli_offset = obj.location
+    return group
+
+def layout_in_grid(objects, border=2):
+    dimx = ceil(sqrt(len(objects)))
+    count = 0
+    x = 0
+    y = 0
+    offset = ((dimx - 1) * border) / 2
+
+    for obj in objects:
+        obj.location.x = x - offset
+        obj.location.y = y - offset
+        count += 1
+        x += border
+        if count >= dimx:
+            y += border
+            x = 0
+            count = 0
+
 class TilesetList(UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index):
         row = layout.row(align=True)
-        if T3DOperatorBase.running_modal and not t3d.manual_mode:
+        if running_modal() and not t3d.manual_mode:
             row.enabled = bool(item.rules)
         row.label(item.tileset)
         # rules = item.tileset.rules
@@ -115,7 +227,7 @@ class TilesetPropertyGroup(PropertyGroup):
     last_tile = StringProperty()
 
 def enum_previews(self, context):
-    return T3DProperties.enum_items
+    return self.get_enum_items()
 
 class T3DProperties(PropertyGroup):
     # IT'S WEIRD how the state of t3d has become split between this and the operator
@@ -134,11 +246,17 @@ class T3DProperties(PropertyGroup):
         subtype="FILE_PATH"
     )
 
+    tile3d_library_tilesets = StringProperty(
+        name="Tilesets",
+        description="Comma separated tilesets to link from the library (tilesets used in the level are always linked, empty links everything)"
+    )
+
     brush_size = IntProperty(
         name="Brush Size",
         description='Radius of brush',
         min=1,
-        max=8,
+        soft_max=64,
+        max=256,
         default=1
     )
 
@@ -147,6 +265,24 @@ class T3DProperties(PropertyGroup):
         description='Use outline brush',
         default=False
     )
+
+    trace_path = StringProperty(
+        name='Trace Path',
+        description='Where to save the trace (chrome://tracing JSON)',
+        default='//t3d_trace.json',
+        subtype='FILE_PATH'
+    )
+
+    show_hud = BoolProperty(
+        name='Show HUD',
+        description='Show performance counters in the viewport',
+        default=False
+    )
+
+    keymap = StringProperty(
+        name='Keymap',
+        description='Text with custom key bindings for the modal operators'
+    )
     
     bdown = BoolProperty()
     bup = BoolProperty()
@@ -174,13 +310,11 @@ class T3DProperties(PropertyGroup):
         return text
     
     def get_cursor_pos(self):
-        if T3DOperatorBase.running_modal:
-            vec = t3d.cursor.pos.copy()
-            round_vector(vec)
-            return vec
+        if running_modal():
+            return t3d.cursor.pos
         return (0,0,0)
     def set_cursor_pos(self, value):
-        t3d.cursor.pos = Vector(value)
+        t3d.cursor.pos = Cell(*value)
         t3d.construct_select_cube()
 
     cursor_pos = IntVectorProperty(
@@ -196,7 +330,7 @@ class T3DProperties(PropertyGroup):
 
     def set_tile3d(self, value):
         self.tile_previews_ = value
-        id, name, desc, icon, i = self.enum_items[value]  # index == i?
+        id, name, desc, icon, i = self.get_enum_items()[value]  # index == i?
         send_event('set_tile3d', id)
 
     tile_previews = EnumProperty(
@@ -206,51 +340,65 @@ class T3DProperties(PropertyGroup):
         set=set_tile3d
     )
 
+    @traced()
     def refresh_tilesets(self):
+        # only touch the tilesets that changed
+        found = registry.scan()
         tilesets = {tileset.tileset: tileset for tileset in self.tilesets}
-        for tileset in self.tilesets:
-            tileset.tiles.clear()
-        for group in bpy.data.groups:
-            try:
-                obj = group.objects[group.name]
-            except KeyError:
-                continue # not a tile
-            name = obj.tileset
-            if not name: continue # not a tile
+        for name, tiles in sorted(found.items()):
             if name not in tilesets:
                 tileset = self.tilesets.add()
                 tileset.tileset = name
-                tilesets[name] = tileset
             else:
                 tileset = tilesets[name]
-            tile3d = tileset.tiles.add()
-            tile3d.tile3d = obj.name
-
-        for i, tileset in enumerate(self.tilesets):
-            if not tileset.tiles:
+                if [tile3d.tile3d for tile3d in tileset.tiles] == tiles: continue
+                tileset.tiles.clear()
+            for tile in tiles:
+                tile3d = tileset.tiles.add()
+                tile3d.tile3d = tile
+
+        for i in reversed(range(len(self.tilesets))):
+            if self.tilesets[i].tileset not in found:
                 self.tilesets.remove(i)
         self.tileset_idx = clamp(self.tileset_idx, 0, len(self.tilesets)-1)
+        previews.hashes.clear() # tiles might have been edited
         self.refresh_enum_items()
         send_event('refresh_tilesets')
 
     # having non-blender properties on here is hacky
     enum_items = []
     enum_items_dict = {}
-    use_previews = False
+    enum_items_dirty = True
+    use_previews_ = False
 
     def refresh_enum_items(self):
+        # (built when needed, see get_enum_items)
+        T3DProperties.enum_items_dirty = True
+
+    def get_enum_items(self):
+        if T3DProperties.enum_items_dirty:
+            self.build_enum_items()
+        return T3DProperties.enum_items
+
+    def build_enum_items(self):
         T3DProperties.enum_items = []
+        T3DProperties.enum_items_dirty = False
         tileset = self.tileset
         if not tileset: return
         use_previews = False
         for i, tile3d in enumerate(tileset.tiles):
             obj = bpy.data.objects[tile3d.tile3d]
-            use_previews = use_previews or obj.preview.is_image_custom
-            icon = obj.preview.icon_id if obj.preview.is_image_custom else ""
-            T3DProperties.enum_items.append((obj.name, obj.name, "", icon, i))
-        T3DProperties.use_previews = use_previews
+            icon = previews.get_icon(obj) # from the thumbnail cache
+            use_previews = use_previews or bool(icon)
+            T3DProperties.enum_items.append((obj.name, obj.name, "", icon or "", i))
+        T3DProperties.use_previews_ = use_previews
         T3DProperties.enum_items_dict = {id: i for id, name, desc, icon, i in T3DProperties.enum_items}
 
+    def get_use_previews(self):
+        self.get_enum_items()
+        return T3DProperties.use_previews_
+    use_previews = property(get_use_previews)
+
     tilesets = CollectionProperty(
         name='Tilesets',
         description='Tilesets (for auto-tiling)',
@@ -271,28 +419,28 @@ class T3DProperties(PropertyGroup):
     def get_tileset_idx(self):
         return self.tileset_idx_
     def set_tileset_idx(self, value):
-        if T3DOperatorBase.running_modal and not t3d.manual_mode:
+        if running_modal() and not t3d.manual_mode:
             tileset = self.tilesets[value]
             if not tileset.rules:
                 # if in auto-mode, don't let set index to tileset that doesn't have rules
                 return
-        if T3DOperatorBase.running_modal and t3d.manual_mode:
+        if running_modal() and t3d.manual_mode:
             tileset = self.tileset
             tileset.last_tile = self.tile_previews
 
         self.tileset_idx_ = value
         self.refresh_enum_items()
 
-        if T3DOperatorBase.running_modal and t3d.manual_mode:
+        if running_modal() and t3d.manual_mode:
             tileset = self.tileset
             if tileset.last_tile:
                 try:
                     self.tile_previews = tileset.last_tile
                 except TypeError:
-                    tile3d = self.enum_items[0][0]
+                    tile3d = self.get_enum_items()[0][0]
                     self.tile_previews = tile3d
             else:
-                tile3d = self.enum_items[0][0]
+                tile3d = self.get_enum_items()[0][0]
                 self.tile_previews = tile3d
 
     tileset_idx = IntProperty(
@@ -327,12 +475,12 @@ class T3DProperties(PropertyGroup):
     )
 
     def get_down(self):
-        if T3DOperatorBase.running_modal:
+        if running_modal():
             return t3d.state.paint
         return False
 
     def set_down(self, value):
-        if T3DOperatorBase.running_modal:
+        if running_modal():
             t3d.state.paint = value
 
     down = BoolProperty(
@@ -355,6 +503,46 @@ class T3DProperties(PropertyGroup):
         description='Ceiling object for Room Gen'
     )
 
+def get_active_tileset(context):
+    prop = context.scene.t3d_prop
+    try:
+        return prop.tilesets[prop.tileset_idx]
+    except IndexError:
+        return None
+
+def forward_result(result):
+    # the modal operator keeps running by itself
+    if 'RUNNING_MODAL' in result or 'FINISHED' in result:
+        return {'FINISHED'}
+    return {'CANCELLED'}
+
+class ManualModeProxy(Operator):
+    """Manually position tiles"""
+    bl_idname = "view3d.t3d_manual"
+    bl_label = "Manual Mode"
+
+    @classmethod
+    def poll(cls, context):
+        return get_active_tileset(context) is not None and not running_modal()
+
+    def invoke(self, context, event):
+        load_engine()
+        return forward_result(bpy.ops.view3d.t3d_manual_modal('INVOKE_DEFAULT'))
+
+class AutoModeProxy(Operator):
+    """Automatically generate tiles from terrain"""
+    bl_idname = "view3d.t3d_auto"
+    bl_label = "Auto Mode"
+
+    @classmethod
+    def poll(cls, context):
+        tileset = get_active_tileset(context)
+        return tileset is not None and bool(tileset.rules) and not running_modal()
+
+    def invoke(self, context, event):
+        load_engine()
+        return forward_result(bpy.ops.view3d.t3d_auto_modal('INVOKE_DEFAULT'))
+
 class TilesetActionsOperator(bpy.types.Operator):
     bl_idname = "view3d.t3d_tileset_actions"
     bl_label = "Tileset Actions"
@@ -384,9 +572,64 @@ class TilesetActionsOperator(bpy.types.Operator):
                 prop.tileset_idx -= 1
         if self.action == 'REFRESH':
             prop.refresh_tilesets()
+            prop.get_enum_items()
+            if previews.queue or previews.missing:
+                bpy.ops.view3d.t3d_cache_previews('INVOKE_DEFAULT')
 
         return {"FINISHED"}
 
+class ToggleTrace(Operator):
+    """Start recording a trace, or stop and save it"""
+    bl_idname = "view3d.t3d_toggle_trace"
+    bl_label = "Toggle Trace"
+
+    def execute(self, context):
+        if not trace.enabled:
+            trace.enable()
+            self.report({'INFO'}, 'tracing')
+            return {'FINISHED'}
+        trace.disable()
+        path = bpy.path.abspath(context.scene.t3d_prop.trace_path)
+        try:
+            count = trace.save(path)
+        except OSError as e:
+            self.report({'ERROR'}, 'could not save trace: {}'.format(e))
+            return {'CANCELLED'}
+        self.report({'INFO'}, 'saved {} trace events to {}'.format(count, path))
+        return {'FINISHED'}
+
+class CachePreviewsOperator(Operator):
+    """Write tile previews to the thumbnail cache in the background (rendering tiles without one)"""
+    bl_idname = "view3d.t3d_cache_previews"
+    bl_label = "Cache Previews"
+
+    _timer = None
+    running = False
+
+    def modal(self, context, event):
+        if event.type != 'TIMER': return {'PASS_THROUGH'}
+        if not previews.process_queue(): return {'PASS_THROUGH'}
+        # then render whatever has no preview at all
+        if not previews.poll_render(): return {'PASS_THROUGH'}
+        if previews.start_render(): return {'PASS_THROUGH'}
+        context.window_manager.event_timer_remove(self._timer)
+        CachePreviewsOperator.running = False
+        context.scene.t3d_prop.refresh_enum_items() # pick up the new thumbnails
+        update_3dviews()
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if CachePreviewsOperator.running: return {'CANCELLED'}
+        for tileset in context.scene.t3d_prop.tilesets:
+            for tile3d in tileset.tiles:
+                obj = bpy.data.objects.get(tile3d.tile3d)
+                if obj: previews.get_icon(obj) # queues anything not cached yet
+        if not previews.queue and not previews.missing: return {'FINISHED'}
+        CachePreviewsOperator.running = True
+        self._timer = context.window_manager.event_timer_add(0.1, context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
 class T3DToolsPanel(Panel):
     bl_idname = "view3d.t3d_tools_panel"
     bl_label = "Tools"
@@ -399,11 +642,11 @@ class T3DToolsPanel(Panel):
         layout = self.layout
         prop = context.scene.t3d_prop
 
-        layout.operator(ManualModeOperator.bl_idname)
-        layout.operator(AutoModeOperator.bl_idname)
+        layout.operator(ManualModeProxy.bl_idname)
+        layout.operator(AutoModeProxy.bl_idname)
 
         col = layout.column()
-        col.enabled = T3DOperatorBase.running_modal and t3d.manual_mode
+        col.enabled = running_modal() and t3d.manual_mode
         if prop.use_previews:
             col.template_icon_view(prop, 'tile_previews')
         col.prop(prop, 'tile_previews') # still have to draw both because previews has no text + sometimes rubbish
@@ -412,7 +655,7 @@ class T3DToolsPanel(Panel):
         row.template_list('TilesetList', '', prop, 'tilesets', prop, 'tileset_idx', rows=3)
 
         col = row.column(align=True)
-        col.enabled = not T3DOperatorBase.running_modal
+        col.enabled = not running_modal()
         col.operator(TilesetActionsOperator.bl_idname, icon='FILE_REFRESH', text="").action = 'REFRESH'
         col.separator()
         col.operator(TilesetActionsOperator.bl_idname, icon='TRIA_UP', text="").action = 'UP'
@@ -431,7 +674,7 @@ class T3DDrawingPanel(Panel):
         prop = context.scene.t3d_prop
 
         col = layout.column()
-        col.enabled = T3DOperatorBase.running_modal
+        col.enabled = running_modal()
         col.prop(prop, 'user_layer')
         row = col.row()
         row.prop(prop, 'cursor_pos', text='')
@@ -442,6 +685,11 @@ class T3DDrawingPanel(Panel):
         col.prop(prop, 'down')
         col.prop(prop, 'outline')
         col.prop(prop, 'brush_size')
+        layout.prop(prop, 'show_hud')
+        row = layout.row(align=True)
+        row.operator(ToggleTrace.bl_idname, text='Stop Trace' if trace.enabled else 'Start Trace',
+                     icon='REC' if trace.enabled else 'NONE')
+        row.prop(prop, 'trace_path', text='')
 
     def display_selected_tile3d(self, layout, context):
         obj = context.object
@@ -465,6 +713,8 @@ class T3DUtilsPanel(Panel):
         sub.scale_x = 3.0
         sub.prop(prop, 'tile3d_library_path', text="")
         row.operator(LinkTile3DLibrary.bl_idname)
+        layout.prop(prop, 'tile3d_library_tilesets')
+        layout.operator(WriteLibraryManifest.bl_idname)
         layout.operator(T3DSetupTilesOperator.bl_idname)
         layout.separator()
         col = layout.column(align=True)
@@ -476,6 +726,7 @@ class T3DUtilsPanel(Panel):
         layout.separator()
         layout.operator(MakeTilesRealOperator.bl_idname)
         layout.operator(AlignTiles.bl_idname)
+        layout.prop_search(prop, 'keymap', bpy.data, 'texts')
         # layout.operator(XmlExportOperator.bl_idname)
         
         layout.separator()
@@ -528,7 +779,7 @@ class T3DObjectPanel(Panel):
         return True
 
 class LinkTile3DLibrary(Operator):
-    """Link all groups from linked library"""
+    """Link tilesets from tile3d library"""
     bl_idname = "view3d.link_tile3d_library"
     bl_label = "Link"
 
@@ -536,12 +787,62 @@ class LinkTile3DLibrary(Operator):
         t3d = context.scene.t3d_prop
         path = t3d.tile3d_library_path
         if not path: return {'FINISHED'}
+        manifest = library.read_manifest(path)
+        if manifest is None:
+            return self.link_all(path)
+
+        lib = library.get_library(path)
+        linked_groups, linked_texts = library.get_linked(lib)
+        selected = {name.strip() for name in t3d.tile3d_library_tilesets.split(',') if name.strip()}
+        used_groups = library.get_used_groups(context.scene, lib)
+        tilesets = library.get_wanted_tilesets(manifest, selected, used_groups)
+        groups = []
+        for name in sorted(tilesets):
+            groups.extend(manifest['tilesets'][name]['tiles'])
+        groups = [group for group in groups if group not in linked_groups]
+        texts = [text for text in manifest['texts'] if text not in linked_texts]
+        if not groups and not texts:
+            self.report({'INFO'}, 'library up to date')
+            return {'FINISHED'}
+        with bpy.data.libraries.load(path, link=True) as (data_src, data_dst):
+            data_dst.groups = groups
+            data_dst.texts = texts
+        self.report({'INFO'}, 'linked {} groups from {} tilesets'.format(len(groups), len(tilesets)))
+        return {'FINISHED'}
+
+    def link_all(self, path):
+        # no manifest (or it's stale), link everything and write one for next time
         with bpy.data.libraries.load(path, link=True) as (data_src, data_dst):
             # link groups
             data_dst.groups = data_src.groups
             self.report({'INFO'}, 'linked {} groups'.format(len(data_src.groups)))
             # link texts
             data_dst.texts = data_src.texts
+        try:
+            manifest = library.build_manifest(path, data_dst.groups, data_dst.texts)
+            library.write_manifest(path, manifest)
+        except OSError as e:
+            self.report({'WARNING'}, 'could not write library manifest: {}'.format(e))
+        return {'FINISHED'}
+
+class WriteLibraryManifest(Operator):
+    """Write manifest for this file, so levels can link tilesets from it quickly"""
+    bl_idname = "view3d.t3d_write_library_manifest"
+    bl_label = "Write Library Manifest"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(bpy.data.filepath)
+
+    def execute(self, context):
+        path = bpy.data.filepath
+        if bpy.data.is_dirty:
+            bpy.ops.wm.save_mainfile() # manifest is only valid for the saved mtime
+        groups = [group for group in bpy.data.groups if not group.library]
+        texts = [text for text in bpy.data.texts if not text.library]
+        manifest = library.build_manifest(path, groups, texts)
+        library.write_manifest(path, manifest)
+        self.report({'INFO'}, 'wrote manifest for {} tilesets'.format(len(manifest['tilesets'])))
         return {'FINISHED'}
 
 class SetActiveTile3D(Operator):
@@ -554,7 +855,7 @@ class SetActiveTile3D(Operator):
 
     @classmethod
     def poll(cls, context):
-        if not T3DOperatorBase.running_modal: return False
+        if not running_modal(): return False
         if not t3d.manual_mode: return False
         obj = context.object
         if not obj: return False
@@ -584,10 +885,10 @@ class CursorToSelected(Operator):
 
     @classmethod
     def poll(cls, context):
-        return T3DOperatorBase.running_modal and context.object
+        return running_modal() and context.object
 
     def execute(self, context):
-        t3d.cursor.pos = context.object.pos
+        t3d.cursor.pos = context.object.cell
         t3d.construct_select_cube()
         return {'FINISHED'}
 
@@ -598,7 +899,7 @@ class Goto3DCursor(Operator):
 
     @classmethod
     def poll(cls, context):
-        return T3DOperatorBase.running_modal
+        return running_modal()
 
     def execute(self, context):
         # note: doesn't make sense when root rotated in x or y
@@ -629,18 +930,15 @@ class AlignTiles(Operator):
 
     @classmethod
     def poll(cls, context):
-        return T3DOperatorBase.running_modal
+        return running_modal()
 
     def execute(self, context):
-        # for every child, align to grid
-        for child in t3d.root.children:
-            vec = child.pos
-            round_vector(vec)
-            child.pos = vec
-
-            rot = degrees(child.rot)
-            rot = roundbase(rot, 90)
-            child.rot = radians(rot)
+        count, collisions = t3d.align_tiles()
+        self.report({'INFO'}, 'aligned {} tiles'.format(count))
+        if collisions:
+            cells = ', '.join('({}, {}, {})'.format(*cell) for cell, layer in collisions[:5])
+            self.report({'WARNING'}, '{} cells have more than one tile: {}{}'.format(
+                len(collisions), cells, '...' if len(collisions) > 5 else ''))
         return {'FINISHED'}
 
 class T3DSetupTilesOperator(Operator):
@@ -657,7 +955,7 @@ class T3DSetupTilesOperator(Operator):
         
     @classmethod
     def poll(self, context):
-        return context.mode == "OBJECT" and not T3DOperatorBase.running_modal
+        return context.mode == "OBJECT" and not running_modal()
 
     def execute(self, context):
         self.setup_tiles(context)
@@ -665,35 +963,10 @@ class T3DSetupTilesOperator(Operator):
 
     def create_groups(self):
         for obj in self.objects:
-            children = get_children(obj)
-            if obj.name in bpy.data.groups:
-                # reuse
-                group = bpy.data.groups[obj.name]
-                for object in list(group.objects):
-                    group.objects.unlink(object)
-            else:
-                group = bpy.data.groups.new(name=obj.name)
-            group.objects.link(obj)
-            for child in children:
-                group.objects.link(child)
-            group.dupli_offset = obj.location
+            create_tile_group(obj)
 
     def layout_in_grid(self, border=2):
-        dimx = ceil(sqrt(len(self.objects)))
-        count = 0
-        x = 0
-        y = 0
-        offset = ((dimx - 1) * border) / 2
-
-        for obj in self.objects:
-            obj.location.x = x - offset
-            obj.location.y = y - offset
-            count += 1
-            x += border
-            if count >= dimx:
-                y += border
-                x = 0
-                count = 0
+        layout_in_grid(self.objects, border)
 
     def rename_objects(self):
         for obj in self.objects:
@@ -712,11 +985,15 @@ class T3DSetupTilesOperator(Operator):
         self.create_groups()
         self.report({'INFO'}, '{} objects added to groups'.format(len(self.objects)))
 
+ROOMGEN_PROP = 't3d_roomgen' # on generated objects, the tileset that made them
+
 class RoomGenOperator(Operator):
     bl_idname = 'view3d.t3d_room_gen'
     bl_label = 'Room Gen'
     bl_description = 'Generate tileset from "Wall", "Floor" and "Ceiling" groups'
 
+    # wall masks (WSEN) to generate, the other z rotations come from the rules' ROTATE
+    # (add masks, or override get_parts, for more variants)
     masks = (
         0b0000,
         0b0001,
@@ -728,7 +1005,7 @@ class RoomGenOperator(Operator):
 
     @classmethod
     def poll(cls, context):
-        return context.mode == "OBJECT" and not T3DOperatorBase.running_modal
+        return context.mode == "OBJECT" and not running_modal()
 
     def execute(self, context):
         prop = context.scene.t3d_prop
@@ -739,71 +1016,65 @@ class RoomGenOperator(Operator):
         self.make_tileset(name, wall, ceiling, floor)
         return {'FINISHED'}
 
+    def get_rules(self):
+        # every rule (DUWSEN) we write a line for
+        for j in range(4):
+            for m in self.masks:
+                yield (j << 4) | m
+
+    def get_parts(self, rule, wall, ceiling, floor):
+        # (group, z rotation in degrees) of each piece of the tile for rule
+        parts = []
+        if wall:
+            for i in range(4):
+                if not rule & 1 << i:
+                    parts.append((wall, i * -90))
+        if ceiling and not rule & 1 << 4:
+            parts.append((ceiling, 0))
+        if floor and not rule & 1 << 5:
+            parts.append((floor, 0))
+        return parts
+
     def make_tileset(self, name, wall, ceiling, floor):
-        haswall =    bool(wall)    or wall    in bpy.data.groups
-        hasceiling = bool(ceiling) or ceiling in bpy.data.groups
-        hasfloor =   bool(floor)   or floor   in bpy.data.groups
-        if not haswall and not hasceiling and not hasfloor:
+        wall =    wall    if wall    in bpy.data.groups else None
+        ceiling = ceiling if ceiling in bpy.data.groups else None
+        floor =   floor   if floor   in bpy.data.groups else None
+        if not wall and not ceiling and not floor:
             self.report({'WARNING'}, 'group "Wall", "Floor" or "Ceiling" not found, no tiles generated')
             return
-            
+
         if name in bpy.data.scenes:
-            # reuse
+            # reuse. delete the tiles we generated last time, so their names are free
+            # (only ours, anything else the user put in the scene is kept)
             scene = bpy.data.scenes[name]
             for obj in list(scene.objects):
-                scene.objects.unlink(obj)
+                if obj.get(ROOMGEN_PROP) == name:
+                    bpy.data.objects.remove(obj, True)
         else:
             scene = bpy.data.scenes.new(name=name)
         bpy.context.screen.scene = scene
 
         tileset = name
         name = name.lower()
+        # bits that make a difference, rules that are the same after masking share a tile
+        filter = bool(floor) << 5 | bool(ceiling) << 4 | (0b1111 if wall else 0)
 
-        tiles = {}
-
-        index = 0
+        tiles = {} # masked rule -> tile
         lines = []
-        for j in range(4):
-            c = j & 0b01
-            f = j & 0b10
-            for m in self.masks:
-                rule = (j << 4) | m
-                filter = hasfloor << 5 | hasceiling << 4 | haswall << 3 | haswall << 2 | haswall << 1 | haswall
-                newrule = rule & filter
-                if newrule in tiles:
-                    tilename = tiles[newrule].name
-                else:
-                    objs = []
-                    # walls
-                    for i in range(4):
-                        w = m & 1 << i
-                        if not w and haswall:
-                            obj = create_group_instance(wall)
-                            obj.rotation_euler.z = radians(i * -90)
-                            objs.append(obj)
-                    # ceiling
-                    if not c and hasceiling:
-                        obj = create_group_instance(ceiling)
-                        objs.append(obj)
-                    # floor
-                    if not f and hasfloor:
-                        obj = create_group_instance(floor)
-                        objs.append(obj)
-                        
-                    bpy.ops.object.empty_add()
-                    empty = bpy.context.object
-                    empty.name = name + format(index, '02d')
-                    empty.name = name + format(index, '02d') # insist (can't reuse objects
-                    empty.empty_draw_size = 0
-                    for obj in objs:
-                        obj.parent = empty
-
-                    tiles[rule] = empty
-                    tilename = empty.name
-                    index += 1
-
-                rulestr = "{} {}\n".format(format(rule, '06b'), tilename)
-                lines.append(rulestr)
+        for rule in self.get_rules():
+            key = rule & filter
+            if key not in tiles:
+                empty = bpy.data.objects.new(name + format(len(tiles), '02d'), None)
+                empty.empty_draw_size = 0
+                empty[ROOMGEN_PROP] = tileset
+                scene.objects.link(empty)
+                for group, rot in self.get_parts(key, wall, ceiling, floor):
+                    obj = create_group_instance(group, scene)
+                    obj.rotation_euler.z = radians(rot)
+                    obj.parent = empty
+                    obj[ROOMGEN_PROP] = tileset
+                tiles[key] = empty
+            lines.append("{} {}\n".format(format(rule, '06b'), tiles[key].name))
 
         text_name = name+'.txt'
         if text_name in bpy.data.texts:
@@ -812,38 +1083,80 @@ class RoomGenOperator(Operator):
             text.clear()
         else:
             text = bpy.data.texts.new(name=text_name)
-        for line in lines:
-            text.write(line)
+        text.write(''.join(lines))
 
-        bpy.ops.view3d.t3d_setup_tiles(layout_grid=True)
-
-        for tile3d in tiles.values():
+        # same as setup tiles, but only for what we made
+        tile3ds = list(tiles.values())
+        layout_in_grid(tile3ds)
+        for tile3d in tile3ds:
+            create_tile_group(tile3d)
             tile3d.tileset = tileset
+        self.report({'INFO'}, '{} tiles generated'.format(len(tile3ds)))
 
 class MakeTilesRealOperator(Operator):
     bl_idname = 'view3d.t3d_make_tiles_real'
     bl_label = 'Make Tiles Real'
     bl_description = 'Edit details on selected tile without affecting the rest (destructive)'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    join = EnumProperty(
+        name='Join',
+        description='Join the meshes of the new objects',
+        items=(
+            ('NONE', 'None', 'Keep objects separate, sharing mesh data between tiles'),
+            ('CHUNK', 'Chunk', 'One mesh per 16x16x16 area'),
+            ('MATERIAL', 'Material', 'One mesh per material')
+        ),
+        default='NONE'
+    )
 
     @classmethod
     def poll(cls, context):
-        return context.mode == "OBJECT" and not T3DOperatorBase.running_modal
+        return context.mode == "OBJECT" and not running_modal()
 
     def execute(self, context):
+        scene = context.scene
         tiles = [obj for obj in context.selected_objects if obj.dupli_group]
+        created = []
+        buckets = {} # join key -> [(mesh, matrix_world)]
+        not_joined = set()
         for tile in tiles:
-            pos = tile.location.copy()
-            rot = tile.rotation_euler.copy()
             group = tile.dupli_group
+            # group space -> world space
+            mat = tile.matrix_world * Matrix.Translation(-group.dupli_offset)
             for obj in group.objects:
-                if tile.name.startswith(obj.name): continue # ignore root empty
-                new = make_linked_duplicate(obj)
+                if obj.name == group.name: continue # ignore root empty
+                matrix_world = mat * obj.matrix_world
+                if self.join != 'NONE' and obj.type == 'MESH':
+                    if can_join(obj):
+                        for key in self.get_join_keys(tile, obj):
+                            buckets.setdefault(key, []).append((obj.data, matrix_world))
+                        continue
+                    not_joined.add(obj.name)
+                new = make_linked_duplicate(obj, scene)
                 new.parent = None
-                new.location = new.location + pos
-                new.rotation_euler.rotate(rot)
+                new.matrix_world = matrix_world
+                created.append(new)
+        for tile in tiles:
             bpy.data.objects.remove(tile, do_unlink=True)
+        for key, parts in buckets.items():
+            if self.join == 'MATERIAL':
+                created.append(join_meshes('Tiles', parts, scene, only_material=True, material=key))
+            else:
+                created.append(join_meshes('Tiles', parts, scene))
+        for obj in created:
+            obj.select = True
+        self.report({'INFO'}, '{} tiles made real, {} objects'.format(len(tiles), len(created)))
+        if not_joined:
+            self.report({'WARNING'}, 'Not joined (modifiers or object materials): ' + ', '.join(sorted(not_joined)))
         return {'FINISHED'}
 
+    def get_join_keys(self, tile, obj):
+        if self.join == 'CHUNK':
+            # (same cell as the finder, z in tiles)
+            return [chunk_of(get_tile_cell(tile))]
+        return get_mesh_materials(obj.data)
+
 class XmlExportOperator(Operator):
     # test
     bl_idname = 'view3d.t3d_xml_export'
@@ -881,24 +1194,66 @@ class XmlExportOperator(Operator):
 
         return {'FINISHED'}
 
+classes = (
+    TilesetList,
+    TilePropertyGroup,
+    TilesetPropertyGroup,
+    T3DProperties,
+    ManualModeProxy,
+    AutoModeProxy,
+    TilesetActionsOperator,
+    ToggleTrace,
+    CachePreviewsOperator,
+    T3DToolsPanel,
+    T3DDrawingPanel,
+    T3DUtilsPanel,
+    T3DObjectPanel,
+    LinkTile3DLibrary,
+    WriteLibraryManifest,
+    SetActiveTile3D,
+    CursorToSelected,
+    Goto3DCursor,
+    CopyRuleToClipboard,
+    AlignTiles,
+    T3DSetupTilesOperator,
+    RoomGenOperator,
+    MakeTilesRealOperator,
+    XmlExportOperator
+)
+
+import_time = perf_counter() - _import_start
+
 def register():
-    bpy.utils.register_module(__name__)
+    start = perf_counter()
+    for cls in classes:
+        bpy.utils.register_class(cls)
+    previews.register()
     bpy.types.Scene.t3d_prop = PointerProperty(type=T3DProperties)
     init_object_props()
 
     # keymap
     wm = bpy.context.window_manager
-    if wm.keyconfigs.addon is None: return
-    km = wm.keyconfigs.addon.keymaps.new(name='Object Mode', space_type='EMPTY')
-    km.keymap_items.new(SetActiveTile3D.bl_idname, 'S', 'PRESS')
-    # you could do this for all controls, then they'd be configurable
-    # but then you'd have to create thousands of operators?
-    # (there is a 'modal keymap'?. can't find documentation)
-    # https://docs.blender.org/api/blender_python_api_2_70_5/bpy.types.KeyMapItem.html#bpy.types.KeyMapItem
-    addon_keymaps.append(km)
+    if wm.keyconfigs.addon is not None:
+        km = wm.keyconfigs.addon.keymaps.new(name='Object Mode', space_type='EMPTY')
+        km.keymap_items.new(SetActiveTile3D.bl_idname, 'S', 'PRESS')
+        # you could do this for all controls, then they'd be configurable
+        # but then you'd have to create thousands of operators?
+        # (there is a 'modal keymap'?. can't find documentation)
+        # https://docs.blender.org/api/blender_python_api_2_70_5/bpy.types.KeyMapItem.html#bpy.types.KeyMapItem
+        addon_keymaps.append(km)
+
+    register_time = perf_counter() - start
+    msg = 'T3D: import {:.1f}ms, register {:.1f}ms'.format(import_time * 1000, register_time * 1000)
+    if import_time + register_time > REGISTER_BUDGET:
+        logging.warning(msg + ' (over budget of {:.0f}ms)'.format(REGISTER_BUDGET * 1000))
+    else:
+        logging.debug(msg)
 
 def unregister():
-    bpy.utils.unregister_module(__name__)
+    unload_engine()
+    for cls in reversed(classes):
+        bpy.utils.unregister_class(cls)
+    previews.unregister()
     bpy.types.Scene.t3d_prop = None
 
     # keymap
@@ -3,7 +3,9 @@ import logging
 from math import radians
 from random import choice
 import bpy
-from .tilemap3d import Tilemap3D, ADJACENCY_VECTORS, round_vector
+from .tilemap3d import Tilemap3D, ADJACENCY_VECTORS
+from .trace import traced
+from . import rules
 
 CUSTOM_PROP_RULES_FILE = 't3d_rules_file'
 
@@ -13,76 +15,9 @@ def readlines(path):
         lines = [x.strip() for x in lines]
     return lines
 
-class Ruleset:
-    def __init__(self, rules, default):
-        self.rules = rules
-        self.default = default
-
-    def get(self, bitmask):
-        if bitmask in self.rules:
-            return self.rules[bitmask]
-        elif self.default:
-            return self.default
-        # else None
-
-class Rule:
-    def __init__(self, tiles, rot=0):
-        self.tiles = tiles
-        self.rot = rot
-
-    def __str__(self):
-        return '{} {}'.format(self.tiles, self.rot)
-
 def parse_rules(text):
-    ROTATE = {
-        1: [2, 4, 8],
-        3: [6, 12, 9],
-        5: [10, 5, 10],
-        7: [14, 13, 11]
-    }
-    rules = {}
-    default = None
-    lines = [line.body for line in text.lines]
-    for line_no, line in enumerate(lines):
-        if line.startswith('#'): continue # ignore
-        split = line.split(' ')
-        split = [s for s in split if s]
-        if not any(split): continue
-        a = split[0]
-        b = split[1:]
-        newb = []
-        for tilename in b:
-            if tilename.endswith('*'):
-                # wildcard
-                tilename = tilename.replace('*', '')
-                tiles = [group.name for group in bpy.data.groups if group.name.startswith(tilename)]
-                newb += tiles
-            else:
-                newb.append(tilename)
-        b = newb
-        if not b: continue # none or default
-        try:
-            n = int(a, 2)
-            rules[n] = Rule(b)
-            # z rotation rules
-            # (magically you can override these in rules.txt and still works)
-            #     (as long as defined in numerical order)
-            n_ = n & 0b001111
-            d = n & 0b110000
-            if n_ in ROTATE:
-                copyto = ROTATE[n_]
-                for i in range(3):
-                    n__ = copyto[i]
-                    rules[d | n__] = Rule(b, (i+1)*-90)
-        except ValueError as e:
-            if a == 'default':
-                default = Rule(b or None)
-            else:
-                e.line_no = line_no+1
-                e.line = line
-                raise e
-
-    return Ruleset(rules, default)
+    group_names = [group.name for group in bpy.data.groups]
+    return rules.parse_rules((line.body for line in text.lines), group_names)
 
 class AutoTiler3D(Tilemap3D):
     def __init__(self, *args, **kw):
@@ -108,6 +43,7 @@ class AutoTiler3D(Tilemap3D):
             except ValueError as e:
                 raise Exception('"{}": Invalid bitmask, line {}: "{}"'.format(tileset.rules, e.line_no, e.line))
 
+    @traced()
     def refresh_tilesets(self):
         Tilemap3D.refresh_tilesets(self)
         self.init_rules()
@@ -144,6 +80,7 @@ class AutoTiler3D(Tilemap3D):
         adjacent = [self.finder.get_tiles_at(self.cursor.pos + vec) for vec in ADJACENCY_VECTORS]
         return center, adjacent
 
+    @traced()
     def repaint_adjacent(self):
         orig_pos = self.cursor.pos
         points = [orig_pos + vec for vec in ADJACENCY_VECTORS]
@@ -151,17 +88,13 @@ class AutoTiler3D(Tilemap3D):
         self.finder.invalidate() # hmm, calling this quite a lot
 
     def get_bitmask(self, adjacent):
-        bitmask = 0
-        for i, tiles in enumerate(adjacent):
-            bitmask |= bool(tiles) << i
-        return bitmask
+        return rules.get_bitmask(adjacent)
 
     def optimized_new_auto_tile(self, bitmasks):
         # assume obstructing tiles already deleted
         # use pre-calculated bitmask
 
-        pos = self.cursor.pos.copy().freeze()
-        bitmask = bitmasks[pos]
+        bitmask = bitmasks[self.cursor.pos]
         ruleset = self.rulesets[self.tileset]
         rule = ruleset.get(bitmask)
 
@@ -170,6 +103,7 @@ class AutoTiler3D(Tilemap3D):
             tile3d = self.create_tile(group)
             tile3d.rot = radians(rule.rot)
 
+    @traced()
     def batch_cdraw(self, points):
         # completely override behaviour (optimization)
         if self.state.paint:
@@ -178,6 +112,7 @@ class AutoTiler3D(Tilemap3D):
             self.optimized_delete(points)
 
     def optimized_paint(self, points):
+        points = list(points)
         # clear region first
         self.do_points(points, Tilemap3D.delete, self)
         self.finder.reset()
@@ -188,7 +123,7 @@ class AutoTiler3D(Tilemap3D):
             def __init__(self, pos):
                 self.pos = pos
         def fake_paint(objects):
-            obj = FakeObject(self.cursor.pos.copy())
+            obj = FakeObject(self.cursor.pos)
             objects.append(obj)
         self.do_points(points, fake_paint, objects)
         self.finder.reset(objects)
@@ -197,9 +132,7 @@ class AutoTiler3D(Tilemap3D):
         bitmasks = {}
         def get_bitmasks(bitmasks):
             adjacent = [self.finder.get_tiles_at(self.cursor.pos + vec) for vec in ADJACENCY_VECTORS]
-            bitmask = self.get_bitmask(adjacent)
-            pos = self.cursor.pos.copy().freeze()
-            bitmasks[pos] = bitmask
+            bitmasks[self.cursor.pos] = self.get_bitmask(adjacent)
         self.do_points(points, get_bitmasks, bitmasks)
 
         # do paint
@@ -209,6 +142,7 @@ class AutoTiler3D(Tilemap3D):
         self.optimized_repaint_adjacent(points)
 
     def optimized_delete(self, points):
+        points = list(points)
         # clear region
         self.do_points(points, Tilemap3D.delete, self)
         self.finder.reset()
@@ -216,18 +150,17 @@ class AutoTiler3D(Tilemap3D):
         # do repaint adjacent
         self.optimized_repaint_adjacent(points)
 
+    @traced()
     def optimized_repaint_adjacent(self, points):
-        for point in points: round_vector(point)
-        self.touched = list(points)
+        self.touched = set(points)
         self.do_points(points, self.repaint_adjacent)
         self.touched = None
 
     def optimized_auto_tiling(self):
-        pos = self.cursor.pos.copy()
-        round_vector(pos)
+        pos = self.cursor.pos
         if self.touched is not None:
             if pos in self.touched: return
-            self.touched.append(pos)
+            self.touched.add(pos)
         self.auto_tiling()
 
     def new_auto_tile(self):
@@ -256,6 +189,7 @@ class AutoTiler3D(Tilemap3D):
         bitmask = self.get_bitmask(adjacent)
         ruleset = self.rulesets[tileset]
         rule = ruleset.get(bitmask)
+        self.stats.repaints += 1
 
         self.delete_tile(center[0])
 
@@ -1,19 +1,86 @@
 
 # simple event system
+# listeners are held by weak reference, so a dead operator never gets called
+# while a batch is open, events are queued and identical ones are merged
+
+from weakref import ref, WeakMethod
+from collections import OrderedDict
+from contextlib import contextmanager
 
 listeners = {}
+pending = OrderedDict() # (event, args, kw) -> (args, kw)
+depth = 0
+
+def make_ref(func):
+    try:
+        if hasattr(func, '__self__'):
+            return WeakMethod(func)
+        return ref(func)
+    except TypeError:
+        return lambda: func # can't be weakly referenced, keep it alive
 
 def subscribe(event, func):
     if event not in listeners:
         listeners[event] = []
-    listeners[event].append(func)
+    listeners[event].append(make_ref(func))
 
 def unsubscribe(event, func):
-    listeners[event].remove(func)
-    if not listeners[event]:
+    refs = listeners[event]
+    for r in refs:
+        if r() == func:
+            refs.remove(r)
+            break
+    else:
+        raise ValueError('"{}" is not subscribed to "{}"'.format(func, event))
+    if not refs:
+        del listeners[event]
+
+def dispatch(event, args, kw):
+    if event not in listeners: return
+    refs = listeners[event]
+    for r in list(refs):
+        func = r()
+        if func is None:
+            # listener has been garbage collected
+            refs.remove(r)
+            continue
+        func(*args, **kw)
+    if not refs:
         del listeners[event]
 
 def send_event(event, *args, **kw):
-    if event in listeners:
-        for func in listeners[event]:
-            func(*args, **kw)
\ No newline at end of file
+    if not depth:
+        dispatch(event, args, kw)
+        return
+    try:
+        key = event, args, tuple(sorted(kw.items()))
+        hash(key)
+    except TypeError:
+        key = object() # unhashable arguments, can't merge
+    # move to the end, so merged events still run in the order they were last sent
+    pending.pop(key, None)
+    pending[key] = event, args, kw
+
+def flush():
+    while pending:
+        key, (event, args, kw) = pending.popitem(last=False)
+        dispatch(event, args, kw)
+
+def begin_batch():
+    global depth
+    depth += 1
+
+def end_batch():
+    global depth
+    depth -= 1
+    if not depth:
+        flush()
+
+@contextmanager
+def batch():
+    # e.g. with batch(): ... (events are sent once, when the outermost batch ends)
+    begin_batch()
+    try:
+        yield
+    finally:
+        end_batch()
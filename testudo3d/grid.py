@@ -0,0 +1,330 @@
+# integer grid cells and the point generators (brushes, lines, regions)
+# (pure python, no bpy or mathutils, so it can run outside of blender)
+
+from collections import namedtuple, deque
+from functools import lru_cache
+
+class Cell(namedtuple('Cell', 'x y z')):
+    # an integer grid position
+    # (immutable and hashable, so it can be used as a dict key without freezing)
+    __slots__ = ()
+
+    # anything else (tuples, Vectors) is rounded, so the fields stay ints
+    # (a Cell with float fields would hash differently and miss lookups)
+    def __add__(self, other):
+        if type(other) is not Cell: other = Cell.from_vector(other)
+        return Cell(self.x + other[0], self.y + other[1], self.z + other[2])
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if type(other) is not Cell: other = Cell.from_vector(other)
+        return Cell(self.x - other[0], self.y - other[1], self.z - other[2])
+
+    def __rsub__(self, other):
+        if type(other) is not Cell: other = Cell.from_vector(other)
+        return Cell(other[0] - self.x, other[1] - self.y, other[2] - self.z)
+
+    def __neg__(self):
+        return Cell(-self.x, -self.y, -self.z)
+
+    @staticmethod
+    def from_vector(vec):
+        return Cell(int(round(vec[0])), int(round(vec[1])), int(round(vec[2])))
+
+ORIGIN = Cell(0, 0, 0)
+ADJACENCY = (
+    # DUWSEN
+    Cell(0, 1, 0),
+    Cell(1, 0, 0),
+    Cell(0, -1, 0),
+    Cell(-1, 0, 0),
+    Cell(0, 0, 1),
+    Cell(0, 0, -1)
+)
+ADJACENCY_2D = ADJACENCY[:4]
+
+def snap(vec, tolerance):
+    # the cell vec is in, or None if vec isn't on the grid
+    cell = Cell.from_vector(vec)
+    dx = vec[0] - cell.x
+    dy = vec[1] - cell.y
+    dz = vec[2] - cell.z
+    if dx * dx + dy * dy + dz * dz > tolerance * tolerance:
+        return None
+    return cell
+
+def bounds(a, b):
+    cube_min = Cell(min(a.x, b.x), min(a.y, b.y), min(a.z, b.z))
+    cube_max = Cell(max(a.x, b.x), max(a.y, b.y), max(a.z, b.z))
+    return cube_min, cube_max
+
+def iter_region(cube_min, cube_max):
+    # every cell in the box (lazily)
+    for x in range(cube_min.x, cube_max.x + 1):
+        for y in range(cube_min.y, cube_max.y + 1):
+            for z in range(cube_min.z, cube_max.z + 1):
+                yield Cell(x, y, z)
+
+def region_points(cube_min, cube_max):
+    return list(iter_region(cube_min, cube_max))
+
+def region_volume(cube_min, cube_max):
+    return ((cube_max.x + 1 - cube_min.x) *
+            (cube_max.y + 1 - cube_min.y) *
+            (cube_max.z + 1 - cube_min.z))
+
+CHUNK_SHIFT = 4 # 16x16x16 cells per chunk
+
+def chunk_of(cell):
+    return cell[0] >> CHUNK_SHIFT, cell[1] >> CHUNK_SHIFT, cell[2] >> CHUNK_SHIFT
+
+class CellIndex:
+    # cell -> items, bucketed into chunks so box queries only visit occupied cells
+    def __init__(self):
+        self.cells = {}
+        self.chunks = {}
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell):
+        return cell in self.cells
+
+    def add(self, cell, item):
+        if cell in self.cells:
+            self.cells[cell].append(item)
+            return
+        self.cells[cell] = [item]
+        chunk = chunk_of(cell)
+        if chunk in self.chunks:
+            self.chunks[chunk].add(cell)
+        else:
+            self.chunks[chunk] = {cell}
+
+    def get(self, cell):
+        return self.cells.get(cell, ())
+
+    def bounds(self):
+        # bounding box of the occupied cells
+        if not self.cells: return None
+        xs, ys, zs = zip(*self.cells)
+        return Cell(min(xs), min(ys), min(zs)), Cell(max(xs), max(ys), max(zs))
+
+    def query(self, cube_min, cube_max):
+        # yield (cell, items) for every occupied cell in the box
+        # cost follows the number of occupied cells (or chunks), not the volume
+        cmin = chunk_of(cube_min)
+        cmax = chunk_of(cube_max)
+        volume = region_volume(Cell(*cmin), Cell(*cmax))
+        if volume < len(self.chunks):
+            chunks = (self.chunks.get(chunk) for chunk in iter_region(Cell(*cmin), Cell(*cmax)))
+        else:
+            chunks = (cells for chunk, cells in self.chunks.items()
+                      if cmin[0] <= chunk[0] <= cmax[0] and
+                         cmin[1] <= chunk[1] <= cmax[1] and
+                         cmin[2] <= chunk[2] <= cmax[2])
+        for cells in chunks:
+            if not cells: continue
+            for cell in cells:
+                if (cube_min.x <= cell.x <= cube_max.x and
+                    cube_min.y <= cell.y <= cube_max.y and
+                    cube_min.z <= cell.z <= cube_max.z):
+                    yield cell, self.cells[cell]
+
+def circle_offsets(radius):
+    # midpoint circle around the origin
+    x = radius
+    y = 0
+    err = 0
+    offsets = set()
+    while x >= y:
+        offsets.update((
+            (x, y), (y, x), (-y, x), (-x, y),
+            (-x, -y), (-y, -x), (y, -x), (x, -y)
+        ))
+        y += 1
+        if err <= 0:
+            err += 2 * y + 1
+        if err > 0:
+            x -= 1
+            err -= 2 * x + 1
+    return offsets
+
+def circfill_offsets(radius):
+    # filled circle around the origin, as horizontal spans
+    spans = {} # dy: half width
+    def span(half_width, dy):
+        for row in (dy, -dy):
+            spans[row] = max(spans.get(row, 0), half_width)
+    x = radius
+    y = 0
+    err = -radius
+    while y <= x:
+        lasty = y
+        err += y
+        y += 1
+        err += y
+        span(x, lasty)
+        if err > 0:
+            if x != lasty:
+                span(lasty, x)
+            err -= x
+            x -= 1
+            err -= x
+    return {(dx, dy) for dy, half_width in spans.items()
+            for dx in range(-half_width, half_width + 1)}
+
+@lru_cache(maxsize=None)
+def brush_offsets(radius, outline=False):
+    # the brush stamp only depends on the radius, so only compute it once
+    offsets = circle_offsets(radius) if outline else circfill_offsets(radius)
+    return tuple(sorted(offsets, key=lambda o: (o[1], o[0])))
+
+def circle_points(radius, x0, y0, z):
+    x0 = int(x0)
+    y0 = int(y0)
+    return [Cell(x0 + dx, y0 + dy, z) for dx, dy in brush_offsets(radius, True)]
+
+def plot4(cx, cy, x, y, z):
+    cx = int(cx)
+    cy = int(cy)
+    x = int(x)
+    y = int(y)
+
+    points = line_points(cx - x, cx + x, cy + y, cy + y, z)
+    if x != 0 and y != 0:
+        points += line_points(cx - x, cx + x, cy - y, cy - y, z)
+    return points
+
+def circfill_points(cx, cy, radius, z):
+    cx = int(cx)
+    cy = int(cy)
+    return [Cell(cx + dx, cy + dy, z) for dx, dy in brush_offsets(radius)]
+
+def line_points_3d(x1, y1, z1, x2, y2, z2):
+    # bresenham along the dominant axis
+    points = []
+    dx, dy, dz = abs(x2 - x1), abs(y2 - y1), abs(z2 - z1)
+    sx = 1 if x2 > x1 else -1
+    sy = 1 if y2 > y1 else -1
+    sz = 1 if z2 > z1 else -1
+    if dx >= dy and dx >= dz:
+        e1 = 2 * dy - dx
+        e2 = 2 * dz - dx
+        while x1 != x2:
+            x1 += sx
+            if e1 >= 0:
+                y1 += sy
+                e1 -= 2 * dx
+            if e2 >= 0:
+                z1 += sz
+                e2 -= 2 * dx
+            e1 += 2 * dy
+            e2 += 2 * dz
+            points.append(Cell(x1, y1, z1))
+    elif dy >= dx and dy >= dz:
+        e1 = 2 * dx - dy
+        e2 = 2 * dz - dy
+        while y1 != y2:
+            y1 += sy
+            if e1 >= 0:
+                x1 += sx
+                e1 -= 2 * dy
+            if e2 >= 0:
+                z1 += sz
+                e2 -= 2 * dy
+            e1 += 2 * dx
+            e2 += 2 * dz
+            points.append(Cell(x1, y1, z1))
+    else:
+        e1 = 2 * dy - dz
+        e2 = 2 * dx - dz
+        while z1 != z2:
+            z1 += sz
+            if e1 >= 0:
+                y1 += sy
+                e1 -= 2 * dz
+            if e2 >= 0:
+                x1 += sx
+                e2 -= 2 * dz
+            e1 += 2 * dy
+            e2 += 2 * dx
+            points.append(Cell(x1, y1, z1))
+    return points
+
+def line_points(x1, x2, y1, y2, z, z2=None):
+    if z2 is not None and z2 != z:
+        return line_points_3d(x1, y1, z, x2, y2, z2)
+    points = []
+    dx = x2 - x1
+    dy = y2 - y1
+    if dx == 0:
+        step = 1 if dy > 0 else -1
+        for y in range(y1, y2 + step, step):
+            points.append(Cell(x1, y, z))
+    elif dy == 0:
+        step = 1 if dx > 0 else -1
+        for x in range(x1, x2 + step, step):
+            points.append(Cell(x, y1, z))
+    else:
+        if dy < 0:
+            dy = -dy
+            stepy = -1
+        else:
+            stepy = 1
+
+        if dx < 0:
+            dx = -dx
+            stepx = -1
+        else:
+            stepx = 1
+
+        if dx > dy:
+            frac = dy - (dx >> 1)
+            while x1 != x2:
+                if frac >= 0:
+                    y1 = y1 + stepy
+                    frac = frac - dx
+                x1 = x1 + stepx
+                frac = frac + dy
+                points.append(Cell(x1, y1, z))
+        else:
+            frac = dx - (dy >> 1)
+            while y1 != y2:
+                if frac >= 0:
+                    x1 = x1 + stepx
+                    frac = frac - dy
+                y1 = y1 + stepy
+                frac = frac + dx
+                points.append(Cell(x1, y1, z))
+    return points
+
+class FloodLimitError(Exception):
+    pass
+
+def flood(start, passable, neighbours=ADJACENCY, cube_min=None, cube_max=None, limit=None, walls=False):
+    # breadth first search from start over passable cells
+    # with walls, cells outside the box are just not passable,
+    # otherwise returns None if it leaves the box (i.e. the region isn't enclosed)
+    # raises FloodLimitError if it reaches more than limit cells
+    if not passable(start): return []
+    seen = {start}
+    queue = deque((start,))
+    while queue:
+        cell = queue.popleft()
+        for vec in neighbours:
+            other = cell + vec
+            if other in seen: continue
+            if cube_min is not None and not (
+                    cube_min.x <= other.x <= cube_max.x and
+                    cube_min.y <= other.y <= cube_max.y and
+                    cube_min.z <= other.z <= cube_max.z):
+                if walls: continue
+                if passable(other): return None
+                continue
+            if not passable(other): continue
+            seen.add(other)
+            if limit is not None and len(seen) > limit:
+                raise FloodLimitError(limit)
+            queue.append(other)
+    return list(seen)
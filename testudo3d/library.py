@@ -0,0 +1,98 @@
+# sidecar manifest for tile3d libraries (<library>.t3d.json)
+# lists tilesets, their tiles, rule texts and content hashes, so linking
+# can pick out just the tilesets it needs without opening the whole library
+
+import os
+import json
+import hashlib
+import bpy
+from .registry import get_group_tileset
+from .previews import group_hash
+
+MANIFEST_VERSION = 1
+
+def get_manifest_path(path):
+    return bpy.path.abspath(path) + '.t3d.json'
+
+def get_mtime(path):
+    try:
+        return os.path.getmtime(bpy.path.abspath(path))
+    except OSError:
+        return None
+
+def text_hash(text):
+    return hashlib.sha1(text.as_string().encode()).hexdigest()
+
+def build_manifest(path, groups, texts):
+    # groups and texts are the library's datablocks (local or linked)
+    tilesets = {}
+    for group in groups:
+        if group is None: continue # failed to load
+        tileset = get_group_tileset(group)
+        if not tileset: continue
+        tiles = tilesets.setdefault(tileset, {})
+        tiles[group.name] = group_hash(group)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'mtime': get_mtime(path),
+        'tilesets': {},
+        'texts': {text.name: text_hash(text) for text in texts if text is not None}
+    }
+    for tileset, tiles in tilesets.items():
+        sha = hashlib.sha1()
+        for name in sorted(tiles):
+            sha.update(tiles[name].encode())
+        manifest['tilesets'][tileset] = {
+            'tiles': sorted(tiles),
+            'hash': sha.hexdigest()
+        }
+    return manifest
+
+def write_manifest(path, manifest):
+    manifest_path = get_manifest_path(path)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def read_manifest(path):
+    # returns None if there isn't one or it's out of date
+    try:
+        with open(get_manifest_path(path)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION: return None
+    if manifest.get('mtime') != get_mtime(path): return None
+    return manifest
+
+def get_library(path):
+    path = bpy.path.abspath(path)
+    for library in bpy.data.libraries:
+        if bpy.path.abspath(library.filepath) == path:
+            return library
+
+def get_linked(library):
+    # names of groups and texts already linked from library
+    if library is None: return set(), set()
+    groups = {group.name for group in bpy.data.groups if group.library == library}
+    texts = {text.name for text in bpy.data.texts if text.library == library}
+    return groups, texts
+
+def get_used_groups(scene, library):
+    # groups from library that are instanced in the level
+    used = set()
+    for obj in scene.objects:
+        group = obj.dupli_group
+        if group and group.library == library:
+            used.add(group.name)
+    return used
+
+def get_wanted_tilesets(manifest, selected, used_groups):
+    # selected tilesets and the tilesets the level uses, or everything
+    tilesets = manifest['tilesets']
+    wanted = {name for name in selected if name in tilesets}
+    for name, tileset in tilesets.items():
+        if used_groups.intersection(tileset['tiles']):
+            wanted.add(name)
+    return wanted or set(tilesets)
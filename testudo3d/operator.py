@@ -1,5 +1,6 @@
 
 import logging
+from time import perf_counter
 import bpy
 import bgl
 import blf
@@ -15,7 +16,10 @@ from bpy.types import (
     UIList
 )
 
-from .tilemap3d import Tilemap3D, round_vector
+from .tilemap3d import Tilemap3D, Cell
+from .utils import clamp
+from . import events
+from . import trace
 from .autotiler3d import AutoTiler3D
 
 class Vec2:
@@ -72,9 +76,6 @@ FONT_ID = 0  # hmm
 
 text_cursor = Vec2(0, 0)  # used for UI
 
-def clamp(a, b, c):
-    return max(b, min(a, c))
-
 def draw_line_3d(start, end):
     bgl.glVertex3f(*start)
     bgl.glVertex3f(*end)
@@ -101,6 +102,21 @@ def draw_wire(poly, color):
     draw_line_3d(poly[-1], poly[0]) # close
     bgl.glEnd()
 
+def compile_display_list(func, *args):
+    # record the draw calls made by func into a new display list
+    display_list = bgl.glGenLists(1)
+    bgl.glNewList(display_list, bgl.GL_COMPILE)
+    func(*args)
+    bgl.glEndList()
+    return display_list
+
+def free_display_list(display_list):
+    if display_list is not None:
+        bgl.glDeleteLists(display_list, 1)
+
+def matrix_key(mat):
+    return tuple(tuple(row) for row in mat)
+
 def mat_transform(mat, poly):
     return [mat * v for v in poly]
 
@@ -174,12 +190,84 @@ class QuitError(Exception):
     pass
 
 class KeyInput:
-    def __init__(self, type_, value, func, ctrl=False, shift=False):
+    def __init__(self, type_, value, action, ctrl=False, shift=False, alt=False):
         self.type = type_
         self.value = value
-        self.func = func
+        self.action = action
         self.ctrl = ctrl
         self.shift = shift
+        self.alt = alt
+
+    def get_key(self):
+        return self.type, self.value, self.ctrl, self.shift, self.alt
+    key = property(get_key)
+
+# default controls, can be overridden per action by a keymap text (see parse_keymap)
+DEFAULT_KEYMAP = """
+quit ESC PRESS
+paint RET PRESS
+paint_end RET RELEASE
+delete X PRESS
+delete_end X RELEASE
+grab G PRESS
+strafe_left LEFT_ARROW PRESS ctrl
+strafe_right RIGHT_ARROW PRESS ctrl
+up UP_ARROW PRESS ctrl
+down DOWN_ARROW PRESS ctrl
+west_fast LEFT_ARROW PRESS shift
+east_fast RIGHT_ARROW PRESS shift
+north_fast UP_ARROW PRESS shift
+south_fast DOWN_ARROW PRESS shift
+west LEFT_ARROW PRESS
+east RIGHT_ARROW PRESS
+north UP_ARROW PRESS
+south DOWN_ARROW PRESS
+copy C PRESS ctrl
+paste V PRESS ctrl
+rotate_clipboard R PRESS ctrl
+mirror_clipboard M PRESS ctrl
+select B PRESS
+flood_fill F PRESS
+flood_fill_3d F PRESS shift
+fill_replace F PRESS ctrl
+select_connected L PRESS
+undo Z PRESS ctrl
+redo Z PRESS ctrl shift
+mousepaint LEFTMOUSE PRESS
+mousepaint_end LEFTMOUSE RELEASE
+toggle_mousepaint TAB PRESS
+inc_layer RIGHT_BRACKET PRESS shift
+dec_layer LEFT_BRACKET PRESS shift
+inc_brush_size RIGHT_BRACKET PRESS
+dec_brush_size LEFT_BRACKET PRESS
+"""
+# events blender only uses to move the view, they can't edit the scene
+VIEW_EVENTS = {
+    'MOUSEMOVE', 'INBETWEEN_MOUSEMOVE', 'TIMER', 'MIDDLEMOUSE',
+    'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'
+}
+MODIFIERS = ('ctrl', 'shift', 'alt')
+MODIFIER_COMBOS = tuple((ctrl, shift, alt) for ctrl in (False, True) for shift in (False, True) for alt in (False, True))
+
+def parse_keymap(lines):
+    # one binding per line: action type value [ctrl] [shift] [alt]
+    keyinputs = []
+    for line_no, line in enumerate(lines):
+        line = line.strip()
+        if not line or line.startswith('#'): continue # ignore
+        split = line.split()
+        if len(split) < 3 or any(mod not in MODIFIERS for mod in split[3:]):
+            e = ValueError('invalid key binding')
+            e.line_no = line_no+1
+            e.line = line
+            raise e
+        action, type_, value = split[:3]
+        mods = split[3:]
+        keyinputs.append(KeyInput(type_.upper(), value.upper(), action,
+                                  ctrl='ctrl' in mods,
+                                  shift='shift' in mods,
+                                  alt='alt' in mods))
+    return keyinputs
 
 class T3DOperatorBase:
     running_modal = False
@@ -187,44 +275,59 @@ class T3DOperatorBase:
     def __init__(self):
         self._handle_3d = None
         self._handle_2d = None
+        self._timer = None
+        self.active_area = None
         self.active_scene = None
         self.select_cube = None
         self.mousepaint = False
         self.lastcoord = None
+        self.pending_coord = None
+        self.passed_through = False # an event went to blender since the last check
         self.tile_under_cursor = False
-        self.input_map = [
-            KeyInput('ESC', 'PRESS', self.handle_quit),
-            KeyInput('RET', 'PRESS', self.handle_paint),
-            KeyInput('RET', 'RELEASE', self.handle_paint_end),
-            KeyInput('X', 'PRESS', self.handle_delete),
-            KeyInput('X', 'RELEASE', self.handle_delete_end),
+        self.hover_key = None
+        self.overlay_key = None
+        self.overlay_list = None
+        self.connected_selection = [] # names, kept selected on quit
+        self.input_map = {}
+        self.actions = {
+            'quit': self.handle_quit,
+            'paint': self.handle_paint,
+            'paint_end': self.handle_paint_end,
+            'delete': self.handle_delete,
+            'delete_end': self.handle_delete_end,
             # SHIFT + X delete all layers?
-            KeyInput('G', 'PRESS', self.handle_grab, None),
-            KeyInput('LEFT_ARROW', 'PRESS', lambda: self.translate(-1, 0, 0), ctrl=True),
-            KeyInput('RIGHT_ARROW', 'PRESS', lambda: self.translate(1, 0, 0), ctrl=True),
-            KeyInput('UP_ARROW', 'PRESS', lambda: self.translate(0, 0, 1), ctrl=True),
-            KeyInput('DOWN_ARROW', 'PRESS', lambda: self.translate(0, 0, -1), ctrl=True),
-            KeyInput('LEFT_ARROW', 'PRESS', lambda: self.smart_move(-1, 0, repeat=4), shift=True),
-            KeyInput('RIGHT_ARROW', 'PRESS', lambda: self.smart_move(1, 0, repeat=4), shift=True),
-            KeyInput('UP_ARROW', 'PRESS', lambda: self.smart_move(0, 1, repeat=4), shift=True),
-            KeyInput('DOWN_ARROW', 'PRESS', lambda: self.smart_move(0, -1, repeat=4), shift=True),
-            KeyInput('LEFT_ARROW', 'PRESS', lambda: self.smart_move(-1, 0)),
-            KeyInput('RIGHT_ARROW', 'PRESS', lambda: self.smart_move(1, 0)),
-            KeyInput('UP_ARROW', 'PRESS', lambda: self.smart_move(0, 1)),
-            KeyInput('DOWN_ARROW', 'PRESS', lambda: self.smart_move(0, -1)),
-            KeyInput('C', 'PRESS', self.handle_copy, ctrl=True),
-            KeyInput('V', 'PRESS', self.handle_paste, ctrl=True),
-            KeyInput('B', 'PRESS', self.handle_select),
-            KeyInput('Z', 'PRESS', self.handle_undo, ctrl=True),
-            KeyInput('Z', 'PRESS', self.handle_redo, ctrl=True, shift=True),
-            KeyInput('LEFTMOUSE', 'PRESS', self.handle_mousepaint),
-            KeyInput('LEFTMOUSE', 'RELEASE', self.handle_mousepaint_end),
-            KeyInput('TAB', 'PRESS', self.handle_toggle_mousepaint),
-            KeyInput('RIGHT_BRACKET', 'PRESS', self.handle_inc_layer, shift=True),
-            KeyInput('LEFT_BRACKET', 'PRESS', self.handle_dec_layer, shift=True),
-            KeyInput('RIGHT_BRACKET', 'PRESS', self.handle_inc_brush_size),
-            KeyInput('LEFT_BRACKET', 'PRESS', self.handle_dec_brush_size),
-        ]
+            'grab': self.handle_grab,
+            'strafe_left': lambda: self.translate(-1, 0, 0),
+            'strafe_right': lambda: self.translate(1, 0, 0),
+            'up': lambda: self.translate(0, 0, 1),
+            'down': lambda: self.translate(0, 0, -1),
+            'west_fast': lambda: self.smart_move(-1, 0, repeat=4),
+            'east_fast': lambda: self.smart_move(1, 0, repeat=4),
+            'north_fast': lambda: self.smart_move(0, 1, repeat=4),
+            'south_fast': lambda: self.smart_move(0, -1, repeat=4),
+            'west': lambda: self.smart_move(-1, 0),
+            'east': lambda: self.smart_move(1, 0),
+            'north': lambda: self.smart_move(0, 1),
+            'south': lambda: self.smart_move(0, -1),
+            'copy': self.handle_copy,
+            'paste': self.handle_paste,
+            'rotate_clipboard': self.handle_rotate_clipboard,
+            'mirror_clipboard': self.handle_mirror_clipboard,
+            'select': self.handle_select,
+            'flood_fill': lambda: self.handle_flood_fill(dims=2),
+            'flood_fill_3d': lambda: self.handle_flood_fill(dims=3),
+            'fill_replace': lambda: self.handle_flood_fill(dims=3, replace=True),
+            'select_connected': self.handle_select_connected,
+            'undo': self.handle_undo,
+            'redo': self.handle_redo,
+            'mousepaint': self.handle_mousepaint,
+            'mousepaint_end': self.handle_mousepaint_end,
+            'toggle_mousepaint': self.handle_toggle_mousepaint,
+            'inc_layer': self.handle_inc_layer,
+            'dec_layer': self.handle_dec_layer,
+            'inc_brush_size': self.handle_inc_brush_size,
+            'dec_brush_size': self.handle_dec_brush_size,
+        }
 
     # def __del__(self):
     #     self.on_quit()
@@ -237,7 +340,19 @@ class T3DOperatorBase:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle_2d, 'WINDOW')
         except ValueError:
             pass # not set yet
+        if self._timer:
+            bpy.context.window_manager.event_timer_remove(self._timer)
+            self._timer = None
+        free_display_list(self.overlay_list)
+        self.overlay_list = None
+        self.overlay_key = None
+        events.end_batch()
         deselect_all()
+        # (except what select connected selected)
+        for name in self.connected_selection:
+            obj = bpy.data.objects.get(name)
+            if obj: obj.select = True
+        self.connected_selection = []
         bpy.context.scene.objects.active = self.root
 
     @classmethod
@@ -251,15 +366,35 @@ class T3DOperatorBase:
         if not self.running_modal:
             self.on_quit()
             return {'FINISHED'}
-        context.area.tag_redraw()
         try:
+            # events sent since the last one (e.g. set_tile3d from the UI), merged
+            # (before update, so they apply to this event's stroke)
+            events.flush()
+            self.check_scene_edits()
+            if event.type == 'TIMER':
+                # mouse moves are coalesced, raycast at most once per tick
+                if self.pending_coord is not None:
+                    start = perf_counter()
+                    with trace.span('modal', {'event': 'TIMER'}):
+                        self.update(None)
+                    self.stats.modal_time = perf_counter() - start
+                return {'PASS_THROUGH'}
             if mouseover_region(context.area, event):
-                self.handle_raycast(event)
-                result = self.handle_input(event)
-                self.redraw_select_cube()
-                self.on_update()
-                self.tile_under_cursor = self.get_tile3d() # todo only update when necessary
+                if event.type == 'MOUSEMOVE':
+                    if self.mousepaint:
+                        self.pending_coord = event.mouse_region_x, event.mouse_region_y
+                    return {'PASS_THROUGH'}
+                if event.type == 'LEFTMOUSE' and event.value == 'PRESS' and self.mousepaint:
+                    # paint where the click is, not where the last raycast was
+                    self.pending_coord = event.mouse_region_x, event.mouse_region_y
+                start = perf_counter()
+                with trace.span('modal', {'event': event.type}):
+                    result = self.update(event)
+                self.stats.modal_time = perf_counter() - start
+                if result == {'PASS_THROUGH'}:
+                    self.on_pass_through(event)
                 return result
+            self.on_pass_through(event)
             return {'PASS_THROUGH'}
         except QuitError:
             self.on_quit()
@@ -268,6 +403,38 @@ class T3DOperatorBase:
             self.on_quit()
             raise e
 
+    def on_pass_through(self, event):
+        # blender handles this event, and might edit the scene with it
+        # (delete, duplicate, the outliner...) without t3d knowing
+        if event.type not in VIEW_EVENTS:
+            self.passed_through = True
+
+    def check_scene_edits(self):
+        # after an event was passed through, the finder can't be trusted
+        if not self.passed_through: return
+        self.passed_through = False
+        self.finder.invalidate()
+        self.update_tile_under_cursor()
+
+    def update(self, event):
+        view_state = self.get_view_state()
+        self.handle_raycast() # apply the last mouse move first
+        result = self.handle_input(event) if event else {'PASS_THROUGH'}
+        self.redraw_select_cube()
+        self.on_update()
+        self.update_tile_under_cursor()
+        if self.get_view_state() != view_state or self.prop.show_hud:
+            # only redraw if something we draw has changed
+            self.active_area.tag_redraw()
+        return result
+
+    def update_tile_under_cursor(self):
+        # only look up when the cursor cell or the finder has changed
+        key = tuple(self.cursor.pos), self.layer, self.finder.version
+        if key != self.hover_key:
+            self.tile_under_cursor = self.get_tile3d()
+            self.hover_key = tuple(self.cursor.pos), self.layer, self.finder.version
+
     def invoke(self, context, event):
         if T3DOperatorBase.running_modal: return {'CANCELLED'}
         if context.area.type != 'VIEW_3D':
@@ -276,6 +443,7 @@ class T3DOperatorBase:
 
         try:
             self.init()
+            self.init_input_map()
         except Exception as e:
             self.report({'ERROR'}, str(e))
             self.on_quit()
@@ -284,6 +452,8 @@ class T3DOperatorBase:
         self.construct_select_cube()
         self.init_handlers(context)
         T3DOperatorBase.running_modal = True
+        # while running, events are merged and sent once per modal event
+        events.begin_batch()
         return {'RUNNING_MODAL'}
 
     def error(self, msg):
@@ -291,20 +461,50 @@ class T3DOperatorBase:
 
     def init_handlers(self, context):
         self.active_scene = context.scene
+        self.active_area = context.area
+        self._timer = context.window_manager.event_timer_add(1 / 60, context.window)
         args = (context,)  # the arguments we pass the the callback
         self._handle_3d = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_3d, args, 'WINDOW', 'POST_VIEW')
         self._handle_2d = bpy.types.SpaceView3D.draw_handler_add(self.draw_callback_2d, args, 'WINDOW', 'POST_PIXEL')
         context.window_manager.modal_handler_add(self)
 
+    def init_input_map(self):
+        # compile the keymap into a dict, so dispatch is a single lookup
+        keyinputs = parse_keymap(DEFAULT_KEYMAP.splitlines())
+        name = self.prop.keymap
+        if name:
+            try:
+                user_keyinputs = parse_keymap(line.body for line in bpy.data.texts[name].lines)
+            except KeyError:
+                raise Exception('Keymap "{}" not found'.format(name))
+            except ValueError as e:
+                raise Exception('"{}": Invalid key binding, line {}: "{}"'.format(name, e.line_no, e.line))
+            # user bindings replace the default bindings of the same action (and come first)
+            overridden = {keyinput.action for keyinput in user_keyinputs}
+            keyinputs = user_keyinputs + [keyinput for keyinput in keyinputs if keyinput.action not in overridden]
+        # a binding also fires with extra modifiers held, like the old linear search did
+        # the binding needing the most of the held modifiers wins, then the first one listed
+        # (so ctrl+shift+arrow still strafes, ctrl comes before shift)
+        keyinputs = sorted(keyinputs, key=lambda keyinput: -(keyinput.ctrl + keyinput.shift + keyinput.alt))
+        self.input_map = {}
+        for keyinput in keyinputs:
+            if keyinput.action not in self.actions:
+                raise Exception('Keymap: unknown action "{}"'.format(keyinput.action))
+            for mods in MODIFIER_COMBOS:
+                ctrl, shift, alt = mods
+                if (keyinput.ctrl and not ctrl or
+                    keyinput.shift and not shift or
+                    keyinput.alt and not alt):
+                    continue
+                self.input_map.setdefault((keyinput.type, keyinput.value) + mods, self.actions[keyinput.action])
+
     def handle_input(self, event):
-        for keyinput in self.input_map:
-            if (keyinput.shift and not event.shift or
-                keyinput.ctrl and not event.ctrl):
-                continue
-            if keyinput.type == event.type and keyinput.value == event.value:
-                result = keyinput.func()
-                return result or {'RUNNING_MODAL'}
-        return {'PASS_THROUGH'}
+        if event.type == 'MOUSEMOVE': return {'PASS_THROUGH'} # never bound
+        func = self.input_map.get((event.type, event.value, event.ctrl, event.shift, event.alt))
+        if func is None:
+            return {'PASS_THROUGH'}
+        result = func()
+        return result or {'RUNNING_MODAL'}
 
     def handle_quit(self):
         if self.state.grab:
@@ -317,6 +517,7 @@ class T3DOperatorBase:
             raise QuitError()
 
     def handle_paint(self):
+        self.stats.begin_stroke()
         if self.state.grab:
             self.end_grab()
         elif self.state.select:
@@ -332,6 +533,7 @@ class T3DOperatorBase:
         bpy.ops.ed.undo_push()
 
     def handle_delete(self):
+        self.stats.begin_stroke()
         if self.state.select:
             self.state.delete = True
             self.end_select()
@@ -356,9 +558,29 @@ class T3DOperatorBase:
         self.report({'INFO'}, '({}) tiles copied to clipboard'.format(len(self.clipboard) if self.clipboard else "0"))
 
     def handle_paste(self):
+        self.stats.begin_stroke()
         self.paste()
         bpy.ops.ed.undo_push()
 
+    def handle_rotate_clipboard(self):
+        self.rotate_clipboard()
+
+    def handle_mirror_clipboard(self):
+        self.mirror_clipboard()
+
+    def handle_flood_fill(self, dims=2, replace=False):
+        if self.state.grab: return
+        self.stats.begin_stroke()
+        if self.flood_fill(dims, replace):
+            bpy.ops.ed.undo_push()
+
+    def handle_select_connected(self):
+        tiles = self.get_connected_tiles()
+        for tile3d in tiles:
+            tile3d.select = True
+        self.connected_selection = [tile3d.name for tile3d in tiles]
+        self.report({'INFO'}, '({}) tiles selected'.format(len(tiles)))
+
     def handle_undo(self):
         # self.undo()
         pass
@@ -376,10 +598,10 @@ class T3DOperatorBase:
             # cancel
             self.end_select()
 
-    def handle_raycast(self, event):
-        if not self.mousepaint: return
-
-        coord = event.mouse_region_x, event.mouse_region_y
+    def handle_raycast(self):
+        coord = self.pending_coord
+        self.pending_coord = None
+        if not self.mousepaint or coord is None: return
         if coord == self.lastcoord: return
         self.lastcoord = coord
         view_vector = region_2d_to_vector_3d(bpy.context.region, bpy.context.region_data, coord)
@@ -394,11 +616,9 @@ class T3DOperatorBase:
         plane_pos = intersect_line_plane(ray_origin, ray_origin + view_vector, pos, nml)
         if not plane_pos: return # workaround for quad view?
         mat = self.root.matrix_world.inverted()
-        plane_pos = mat * plane_pos
-        round_vector(plane_pos)
-        if plane_pos != self.lastpos:
-            d = plane_pos - self.lastpos
-            self.on_move(d)
+        cell = Cell.from_vector(mat * plane_pos)
+        if cell != self.lastpos:
+            self.stroke(cell)
 
     def handle_toggle_mousepaint(self):
         if self.mousepaint:
@@ -441,21 +661,36 @@ class T3DOperatorBase:
                                                 cube_min.y - 0.5, cube_max.y + 0.5,
                                                 cube_min.z, cube_max.z + 1.0)
 
-    def draw_callback_3d(self, context):
-        if context.scene != self.active_scene: return
+    def get_view_state(self):
+        # everything the draw callbacks depend on
+        # (if this doesn't change, there is no need to redraw)
+        return (
+            tuple(self.cursor.pos),
+            self.cursor.rot,
+            self.cursor.tile3d,
+            tuple(self.select_start_pos) if self.state.select else None,
+            self.state.select,
+            self.state.grab,
+            self.mousepaint,
+            bool(self.tile_under_cursor),
+            self.prop.brush_size,
+            self.tilesize_z,
+            matrix_key(self.root.matrix_world),
+            None if self.manual_mode else self.tileset,
+        )
+
+    def draw_overlay(self):
         mat_world = self.root.matrix_world
         mat_scale = Matrix.Scale(self.tilesize_z, 4, Vector((0.0, 0.0, 1.0)))
         mat = mat_world * mat_scale
 
-        bgl.glDisable(bgl.GL_DEPTH_TEST)
-
         color = (YELLOW if self.state.select else
                  CYAN if self.mousepaint else WHITE)
         t_cube = mat_transform_edges(mat, self.select_cube)
         draw_edges(t_cube, color)
 
         mat_rot = Matrix.Rotation(radians(self.cursor.rot), 4, 'Z')
-        mat_trans = Matrix.Translation(self.cursor.pos)
+        mat_trans = Matrix.Translation(Vector(self.cursor.pos))
         mat = mat_scale * mat_trans * mat_rot
         mat = mat_world * mat
 
@@ -464,10 +699,10 @@ class T3DOperatorBase:
                  PURPLE if self.tile_under_cursor else DARK_PURPLE)
         draw_poly(t_arrow, color)
 
-        brush_size = context.scene.t3d_prop.brush_size
+        brush_size = self.prop.brush_size
         if not self.state.grab and not self.state.select and brush_size > 1:
             brush_size = brush_size * 2 - 1
-            mat_trans = Matrix.Translation(self.cursor.pos)
+            mat_trans = Matrix.Translation(Vector(self.cursor.pos))
             mat_sx = Matrix.Scale(brush_size, 4, Vector((1.0, 0.0, 0.0)))
             mat_sy = Matrix.Scale(brush_size, 4, Vector((0.0, 1.0, 0.0)))
             mat = mat_trans *  mat_sx * mat_sy
@@ -475,7 +710,22 @@ class T3DOperatorBase:
             t_circle = mat_transform(mat, CIRCLE)
             draw_wire(t_circle, RED)
 
+    def draw_callback_3d(self, context):
+        if context.scene != self.active_scene: return
+        start = perf_counter()
+        # only transform the overlay geometry when it has changed,
+        # otherwise replay the cached display list
+        key = self.get_view_state()
+        if key != self.overlay_key or self.overlay_list is None:
+            self.redraw_select_cube()
+            free_display_list(self.overlay_list)
+            self.overlay_list = compile_display_list(self.draw_overlay)
+            self.overlay_key = key
+
+        bgl.glDisable(bgl.GL_DEPTH_TEST)
+        bgl.glCallList(self.overlay_list)
         restore_gl_defaults()
+        self.stats.draw_time = perf_counter() - start
 
     def draw_callback_2d(self, context):
         if context.scene != self.active_scene: return
@@ -501,11 +751,30 @@ class T3DOperatorBase:
             text = "{}, {}, {}".format(w, d, h)
             draw_text_2d('select dim: ' + text, size=15, color=GREY)
 
+        if self.prop.show_hud:
+            self.draw_hud(context)
+
         restore_gl_defaults()
 
+    def draw_hud(self, context):
+        # performance counters, top left
+        text_cursor.x = 20
+        text_cursor.y = context.region.height - 40
+        stats = self.stats
+        lines = (
+            'modal: {:.2f}ms'.format(stats.modal_time * 1000),
+            'draw: {:.2f}ms'.format(stats.draw_time * 1000),
+            'stroke: +{} -{}'.format(stats.created, stats.deleted),
+            'finder rebuilds: {} (last {:.2f}ms)'.format(stats.finder_rebuilds, stats.finder_time * 1000),
+        )
+        if not self.manual_mode:
+            lines += ('repaints: {}'.format(stats.repaints),)
+        for line in lines:
+            draw_text_2d(line, size=12, color=CYAN)
+
 class ManualModeOperator(Tilemap3D, T3DOperatorBase, Operator):
     """Manually position tiles"""
-    bl_idname = "view3d.t3d_manual"
+    bl_idname = "view3d.t3d_manual_modal"
     bl_label = "Manual Mode"
 
     def __init__(self):
@@ -531,7 +800,7 @@ class ManualModeOperator(Tilemap3D, T3DOperatorBase, Operator):
 
 class AutoModeOperator(AutoTiler3D, T3DOperatorBase, Operator):
     """Automatically generate tiles from terrain"""
-    bl_idname = "view3d.t3d_auto"
+    bl_idname = "view3d.t3d_auto_modal"
     bl_label = "Auto Mode"
 
     @classmethod
@@ -0,0 +1,171 @@
+# on-disk cache of tile preview thumbnails
+# keyed by library path, group name and a hash of the group's contents,
+# loaded into a preview collection only when a tileset is shown
+# custom previews are copied in, tiles without one are rendered by a background blender
+
+import os
+import json
+import shutil
+import logging
+import hashlib
+import tempfile
+from subprocess import Popen
+from collections import deque
+import bpy
+import bpy.utils.previews
+
+CACHE_DIR = 't3d_previews'
+RENDER_SIZE = 128
+RENDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_previews.py')
+
+pcoll = None
+hashes = {} # (library, group) -> content hash
+queue = deque() # (key, object name) waiting to be written to the cache
+queued = set()
+missing = {} # key -> (library abs path or None if local, group name), to be rendered
+failed = set() # rendered but nothing came out, don't try again this session
+render_job = None # (process, temp dir, keys) while rendering
+
+def register():
+    global pcoll
+    pcoll = bpy.utils.previews.new()
+
+def unregister():
+    global pcoll
+    bpy.utils.previews.remove(pcoll)
+    pcoll = None
+    hashes.clear()
+    queue.clear()
+    queued.clear()
+    missing.clear()
+    cancel_render()
+
+def get_cache_dir():
+    return bpy.utils.user_resource('DATAFILES', path=CACHE_DIR, create=True)
+
+def get_library_path(id_):
+    return id_.library.filepath if id_.library else bpy.data.filepath
+
+def group_hash(group):
+    # cheap fingerprint of what the tile looks like
+    # (names, transforms, geometry size and materials of everything in the group)
+    sha = hashlib.sha1()
+    for obj in sorted(group.objects, key=lambda o: o.name):
+        sha.update(obj.name.encode())
+        sha.update(repr([tuple(row) for row in obj.matrix_local]).encode())
+        if obj.dupli_group:
+            sha.update(obj.dupli_group.name.encode())
+        data = obj.data
+        if data is not None:
+            sha.update(data.name.encode())
+            if obj.type == 'MESH':
+                sha.update(repr((len(data.vertices), len(data.polygons))).encode())
+            sha.update(repr([slot.name for slot in obj.material_slots]).encode())
+    return sha.hexdigest()
+
+def get_key(obj):
+    library = get_library_path(obj)
+    name = obj.name
+    if (library, name) not in hashes:
+        group = bpy.data.groups.get(name)
+        hashes[library, name] = group_hash(group) if group else ''
+    sha = hashlib.sha1('{}|{}|{}'.format(library, name, hashes[library, name]).encode())
+    return sha.hexdigest()
+
+def get_icon(obj):
+    # icon id for obj's thumbnail, 0 if there isn't one (yet)
+    key = get_key(obj)
+    if key in pcoll:
+        return pcoll[key].icon_id
+    path = os.path.join(get_cache_dir(), key + '.png')
+    if os.path.exists(path):
+        return pcoll.load(key, path, 'IMAGE').icon_id
+    if obj.preview and obj.preview.is_image_custom:
+        # use it for now, and write it to the cache later
+        if key not in queued:
+            queued.add(key)
+            queue.append((key, obj.name))
+        return obj.preview.icon_id
+    if key not in failed:
+        library = bpy.path.abspath(obj.library.filepath) if obj.library else None
+        missing[key] = (library and os.path.normpath(library), obj.name)
+    return 0
+
+def write_preview(key, obj):
+    preview = obj.preview
+    if not preview or not preview.is_image_custom: return False
+    w, h = preview.image_size
+    if not w or not h: return False
+    path = os.path.join(get_cache_dir(), key + '.png')
+    tmp_path = path + '.tmp.png'
+    image = bpy.data.images.new('t3d_preview', w, h, alpha=True)
+    try:
+        image.pixels = preview.image_pixels_float[:]
+        image.filepath_raw = tmp_path
+        image.file_format = 'PNG'
+        image.save()
+        os.replace(tmp_path, path) # never leave half a thumbnail
+    finally:
+        bpy.data.images.remove(image)
+    return True
+
+def process_queue(count=8):
+    # write a few queued thumbnails, returns True when done
+    for i in range(count):
+        if not queue: return True
+        key, name = queue.popleft()
+        queued.discard(key)
+        obj = bpy.data.objects.get(name)
+        if obj is None: continue
+        try:
+            write_preview(key, obj)
+        except (OSError, RuntimeError) as e:
+            logging.warning('T3D: could not cache preview for "{}": {}'.format(name, e))
+    return not queue
+
+def start_render():
+    # render the missing thumbnails in a background blender, from a copy of this file
+    # (so local tiles look like they do now, saved or not)
+    global render_job
+    if render_job or not missing: return False
+    tmp_dir = tempfile.mkdtemp(prefix='t3d_previews_')
+    blend_path = os.path.join(tmp_dir, 'tiles.blend')
+    bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True, relative_remap=True)
+    cache_dir = get_cache_dir()
+    keys = list(missing)
+    tiles = [{'library': missing[key][0], 'group': missing[key][1],
+              'path': os.path.join(cache_dir, key + '.png')} for key in keys]
+    missing.clear()
+    job_path = os.path.join(tmp_dir, 'job.json')
+    with open(job_path, 'w') as f:
+        json.dump({'size': RENDER_SIZE, 'tiles': tiles}, f)
+    args = [bpy.app.binary_path, '--background', '--factory-startup', blend_path,
+            '--python', RENDER_SCRIPT, '--', job_path]
+    render_job = Popen(args), tmp_dir, keys
+    return True
+
+def poll_render():
+    # True when the render has finished (or there isn't one)
+    global render_job
+    if render_job is None: return True
+    proc, tmp_dir, keys = render_job
+    if proc.poll() is None: return False
+    cache_dir = get_cache_dir()
+    for key in keys:
+        if not os.path.exists(os.path.join(cache_dir, key + '.png')):
+            failed.add(key)
+    if proc.returncode:
+        logging.warning('T3D: preview render exited with {}'.format(proc.returncode))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    render_job = None
+    return True
+
+def cancel_render():
+    global render_job
+    if render_job is None: return
+    proc, tmp_dir, keys = render_job
+    if proc.poll() is None:
+        proc.kill()
+        proc.wait()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    render_job = None
@@ -0,0 +1,97 @@
+# group -> tileset lookup, cached between refreshes
+# linked groups can't change until their library is reloaded,
+# so only local groups and changed libraries are looked at again
+# (and if no group was added or removed, linked groups aren't even iterated)
+
+import os
+import bpy
+
+def get_library_key(library):
+    if library is None: return None # local
+    path = bpy.path.abspath(library.filepath)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return library.filepath, mtime
+
+def get_group_tileset(group):
+    try:
+        obj = group.objects[group.name]
+    except KeyError:
+        return None # not a tile
+    return obj.tileset or None
+
+class TilesetRegistry:
+    def __init__(self):
+        self.libraries = {} # library key -> {group name: tileset}
+        self.signature = None # (number of groups, library keys) at the last full scan
+        self.entries = [] # (group name, tileset), in bpy.data.groups order
+        self.local = [] # (index in entries, group name) of the local groups
+        self.tilesets = {} # the last result
+
+    def scan(self):
+        # returns {tileset: [tile names]}
+        # if no groups were added or removed and no library changed, only the local groups
+        # are looked at again (their tileset can be edited), not every group
+        library_keys = {library.name: get_library_key(library) for library in bpy.data.libraries}
+        signature = (len(bpy.data.groups), tuple(sorted(library_keys.items())))
+        changed = self.rescan_local() if signature == self.signature else None
+        if changed is False:
+            return dict(self.tilesets)
+        if changed is None:
+            self.scan_all(library_keys)
+        self.signature = signature
+        tilesets = {}
+        for name, tileset in self.entries:
+            if not tileset: continue
+            if tileset in tilesets:
+                tilesets[tileset].append(name)
+            else:
+                tilesets[tileset] = [name]
+        self.tilesets = tilesets
+        return dict(tilesets)
+
+    def rescan_local(self):
+        # whether a local group's tileset changed,
+        # or None if a local group has gone (renamed or replaced), then everything is scanned
+        changed = False
+        for i, name in self.local:
+            group = bpy.data.groups.get(name)
+            if group is None or group.library is not None: return None
+            tileset = get_group_tileset(group)
+            if tileset != self.entries[i][1]:
+                self.entries[i] = (name, tileset)
+                changed = True
+        return changed
+
+    def scan_all(self, library_keys):
+        cached = {}
+        entries = []
+        self.local = []
+        for group in bpy.data.groups:
+            library = group.library
+            if library is None:
+                tileset = get_group_tileset(group)
+                self.local.append((len(entries), group.name))
+            else:
+                key = library_keys[library.name]
+                if key not in cached:
+                    cached[key] = self.libraries.get(key, {})
+                groups = cached[key]
+                if group.name in groups:
+                    tileset = groups[group.name]
+                else:
+                    tileset = groups[group.name] = get_group_tileset(group)
+            entries.append((group.name, tileset))
+        self.libraries = cached # forget libraries that have gone or changed
+        self.entries = entries
+
+    def clear(self):
+        self.libraries = {}
+        self.signature = None
+        self.entries = []
+        self.local = []
+        self.tilesets = {}
+
+registry = TilesetRegistry()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+from math import radians, sin
+import bpy
+from mathutils import Vector, Matrix
+
+# renders tile thumbnails for the preview cache (see previews.py)
+# blender --background --factory-startup copy.blend --python render_previews.py -- job.json
+#
+# job.json: {"size": 128, "tiles": [{"library": abs path or null (local), "group": name, "path": png}]}
+
+FOV = radians(35)
+
+def get_group(library, name):
+    for group in bpy.data.groups:
+        if group.name != name: continue
+        if group.library is None:
+            if library is None: return group
+        elif library is not None and os.path.normpath(bpy.path.abspath(group.library.filepath)) == library:
+            return group
+
+def group_points(group, mat, depth=0):
+    # bounding box corners of everything in the group, nested groups too
+    points = []
+    mat = mat * Matrix.Translation(-group.dupli_offset)
+    for obj in group.objects:
+        world = mat * obj.matrix_world
+        if obj.dupli_type == 'GROUP' and obj.dupli_group and depth < 8:
+            points += group_points(obj.dupli_group, world, depth + 1)
+        if obj.type in ('MESH', 'CURVE', 'SURFACE', 'META', 'FONT'):
+            points += [world * Vector(corner) for corner in obj.bound_box]
+    return points
+
+def setup_scene(size):
+    scene = bpy.data.scenes.new('t3d_previews')
+    render = scene.render
+    render.engine = 'BLENDER_RENDER'
+    render.resolution_x = render.resolution_y = size
+    render.resolution_percentage = 100
+    render.alpha_mode = 'TRANSPARENT'
+    render.use_file_extension = False
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGBA'
+    scene.world = bpy.data.worlds.new('t3d_previews')
+    scene.world.light_settings.use_environment_light = True
+    scene.world.light_settings.environment_energy = 0.5
+    lamp = bpy.data.objects.new('t3d_sun', bpy.data.lamps.new('t3d_sun', 'SUN'))
+    lamp.rotation_euler = (radians(40), 0, radians(30))
+    scene.objects.link(lamp)
+    camera = bpy.data.objects.new('t3d_camera', bpy.data.cameras.new('t3d_camera'))
+    camera.data.angle = FOV
+    scene.objects.link(camera)
+    scene.camera = camera
+    return scene
+
+def frame(camera, points):
+    # look at the points from above and to the side
+    if points:
+        lo = Vector([min(p[i] for p in points) for i in range(3)])
+        hi = Vector([max(p[i] for p in points) for i in range(3)])
+    else:
+        lo, hi = Vector((-0.5, -0.5, -0.5)), Vector((0.5, 0.5, 0.5))
+    center = (lo + hi) / 2
+    radius = max((hi - lo).length / 2, 0.1)
+    direction = Vector((1, -1, 0.8)).normalized()
+    camera.location = center + direction * (radius / sin(FOV / 2))
+    camera.rotation_euler = (-direction).to_track_quat('-Z', 'Y').to_euler()
+
+def render_tile(scene, group, path):
+    instance = bpy.data.objects.new('t3d_preview', None)
+    instance.dupli_type = 'GROUP'
+    instance.dupli_group = group
+    scene.objects.link(instance)
+    try:
+        frame(scene.camera, group_points(group, Matrix()))
+        tmp_path = path + '.tmp.png'
+        scene.render.filepath = tmp_path
+        bpy.ops.render.render(write_still=True, scene=scene.name)
+        os.replace(tmp_path, path) # never leave half a thumbnail
+    finally:
+        bpy.data.objects.remove(instance, True)
+
+def main(argv):
+    with open(argv[0]) as f:
+        job = json.load(f)
+    scene = setup_scene(job.get('size', 128))
+    for tile in job['tiles']:
+        group = get_group(tile['library'], tile['group'])
+        if group is None:
+            print('T3D: group "{}" not found'.format(tile['group']))
+            continue
+        try:
+            render_tile(scene, group, tile['path'])
+        except (OSError, RuntimeError) as e:
+            print('T3D: could not render preview for "{}": {}'.format(tile['group'], e))
+
+if __name__ == '__main__':
+    main(sys.argv[sys.argv.index('--') + 1:])
@@ -0,0 +1,83 @@
+# auto-tiling rules
+# (no bpy, so these can be tested and timed outside blender)
+
+# bitmasks are written DUWSEN, bit i is ADJACENCY[i]
+# rules for these (horizontal) bitmasks are copied to their z rotations
+ROTATE = {
+    1: [2, 4, 8],
+    3: [6, 12, 9],
+    5: [10, 5, 10],
+    7: [14, 13, 11]
+}
+
+class Ruleset:
+    def __init__(self, rules, default):
+        self.rules = rules
+        self.default = default
+
+    def get(self, bitmask):
+        if bitmask in self.rules:
+            return self.rules[bitmask]
+        elif self.default:
+            return self.default
+        # else None
+
+class Rule:
+    def __init__(self, tiles, rot=0):
+        self.tiles = tiles
+        self.rot = rot
+
+    def __str__(self):
+        return '{} {}'.format(self.tiles, self.rot)
+
+def parse_rules(lines, group_names=()):
+    # lines of a rules text, group_names are what wildcards match against
+    rules = {}
+    default = None
+    for line_no, line in enumerate(lines):
+        if line.startswith('#'): continue # ignore
+        split = line.split(' ')
+        split = [s for s in split if s]
+        if not any(split): continue
+        a = split[0]
+        b = split[1:]
+        newb = []
+        for tilename in b:
+            if tilename.endswith('*'):
+                # wildcard
+                tilename = tilename.replace('*', '')
+                tiles = [name for name in group_names if name.startswith(tilename)]
+                newb += tiles
+            else:
+                newb.append(tilename)
+        b = newb
+        if not b: continue # none or default
+        try:
+            n = int(a, 2)
+            rules[n] = Rule(b)
+            # z rotation rules
+            # (magically you can override these in rules.txt and still works)
+            #     (as long as defined in numerical order)
+            n_ = n & 0b001111
+            d = n & 0b110000
+            if n_ in ROTATE:
+                copyto = ROTATE[n_]
+                for i in range(3):
+                    n__ = copyto[i]
+                    rules[d | n__] = Rule(b, (i+1)*-90)
+        except ValueError as e:
+            if a == 'default':
+                default = Rule(b or None)
+            else:
+                e.line_no = line_no+1
+                e.line = line
+                raise e
+
+    return Ruleset(rules, default)
+
+def get_bitmask(adjacent):
+    # adjacent: tiles (or just truthiness) of each neighbour, in ADJACENCY order
+    bitmask = 0
+    for i, tiles in enumerate(adjacent):
+        bitmask |= bool(tiles) << i
+    return bitmask
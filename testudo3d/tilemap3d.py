@@ -3,24 +3,44 @@ import builtins
 import bpy
 import logging
 import random
-from math import floor, degrees, radians, atan2, sqrt, isclose
+import numpy as np
+from time import perf_counter
+from math import floor, degrees, radians, atan2, sqrt, isclose, pi
 from mathutils import Vector, Quaternion, Euler, Matrix
-from mathutils.kdtree import KDTree
-from bpy.props import StringProperty
 from .events import subscribe, unsubscribe, send_event
+from .trace import traced
+from .utils import (
+    CUSTOM_PROP_TILE_SIZE_Z,
+    roundbase,
+    round_vector,
+    update_3dviews,
+    get_first_group_name,
+    get_tileset_from_group,
+    init_object_props
+)
+from .grid import (
+    Cell,
+    ORIGIN,
+    ADJACENCY,
+    ADJACENCY_2D,
+    flood,
+    FloodLimitError,
+    snap,
+    bounds,
+    iter_region,
+    CellIndex,
+    brush_offsets,
+    circle_points,
+    circfill_points,
+    plot4,
+    line_points,
+    line_points_3d
+)
 
 TOLERANCE = 0.01
-CUSTOM_PROP_TILE_SIZE_Z = "t3d_tile_size_z"
+MAX_FILL = 1000000 # cells
 CUSTOM_PROP_LAST_CURSOR = 't3d_last_cursor'
-ADJACENCY_VECTORS = (
-    # DUWSEN
-    Vector((0, 1, 0)),
-    Vector((1, 0, 0)),
-    Vector((0, -1, 0)),
-    Vector((-1, 0, 0)),
-    Vector((0, 0, 1)),
-    Vector((0, 0, -1))
-)
+ADJACENCY_VECTORS = ADJACENCY # cells, despite the name
 
 def get_key(dict_, key, default=None):
     try:
@@ -28,9 +48,6 @@ def get_key(dict_, key, default=None):
     except KeyError:
         return default
 
-def roundbase(x, base):
-    return int(base * round(float(x)/base))
-
 def mid(a, b, c):
     return min(max(a, b), max(b, c), max(a, c))
 
@@ -63,86 +80,15 @@ def normalized_XY_to_Zrot_rad(x, y):
     x, y = normalize(x, y)
     return atan2(-x, y)
 
-def round_vector(vec):
-    # it's a shame there's not an IntVector
-    # might have to do less rounding
-    # (hmm, could you just make it? no static types in python though)
-    vec.x = round(vec.x)
-    vec.y = round(vec.y)
-    vec.z = round(vec.z)
-
 def floor_vector(vec):
     vec.x = floor(vec.x)
     vec.y = floor(vec.y)
     vec.z = floor(vec.z)
 
-def update_3dviews():
-    for window in bpy.context.window_manager.windows:
-        for area in window.screen.areas:
-            if area.type == 'VIEW_3D':
-                area.tag_redraw()
-
-def get_first_group_name(obj):
-    if len(obj.users_group) > 0:
-        return obj.users_group[0].name
-
-def get_tileset_from_group(group_name):
-    src = bpy.data.objects[group_name]
-    return src.tileset
-
-def init_object_props():
-    def get_pos(self):
-        vec = self.location.copy()
-        vec.z /= t3d.tilesize_z
-        return vec
-
-    def set_pos(self, vec):
-        vec = vec.copy()
-        vec.z *= t3d.tilesize_z
-        self.location = vec
-
-    def get_rot(self):
-        return self.rotation_euler.z
-
-    def set_rot(self, rot):
-        self.rotation_euler.z = rot
-
-    def get_group(self):
-        if self.dupli_group:
-            return self.dupli_group.name
-
-    def get_tileset(self):
-        if self.dupli_group:
-            return get_tileset_from_group(self.dupli_group.name)
-
-    def is_src_tile(self):
-        name = self.name
-        if name not in bpy.data.groups: return False
-        group = bpy.data.groups[name]
-        if name not in group.objects: return False
-        if not self.tileset: return False
-        return True
-
-    def is_tile(self):
-        if not self.dupli_group: return False
-        name = self.dupli_group.name
-        if name not in self.dupli_group.objects: return False
-        src = self.dupli_group.objects[name]
-        if not src.tileset: return False
-        return True
-
-    # NOTE: these attribute names may conflict with other addons
-    bpy.types.Object.pos = property(get_pos, set_pos)
-    bpy.types.Object.rot = property(get_rot, set_rot)
-    bpy.types.Object.group = property(get_group)
-    bpy.types.Object.src_tileset = property(get_tileset)
-    bpy.types.Object.tileset = StringProperty(name='Tileset')
-    bpy.types.Object.is_src_tile = property(is_src_tile)
-
 class Cursor:
     def __init__(self, tile3d=None, pos=None, rot=0):
         self.tile3d = tile3d
-        self.pos = pos or Vector()
+        self.pos = pos or ORIGIN
         self.rot = rot # in degrees
 
     def get_forward(self):
@@ -151,7 +97,7 @@ class Cursor:
     forward = property(get_forward)
 
     def copy(self):
-        return Cursor(self.tile3d, self.pos.copy(), self.rot)
+        return Cursor(self.tile3d, self.pos, self.rot)
 
     def serialize(self):
         return "{x},{y},{z},{rot}".format(
@@ -169,59 +115,138 @@ class Cursor:
             y = float(y)
             z = float(z)
             rot = float(rot)
-            cursor = Cursor(None, Vector((x, y, z)), rot)
+            cursor = Cursor(None, Cell.from_vector((x, y, z)), rot)
         except:
             cursor = Cursor()
         return cursor
 
 class GrabData:
-    def __init__(self, tile3d):
+    def __init__(self, tile3d, origin):
         self.tile3d = tile3d
+        self.orig_parent = tile3d.parent
+        self.orig_parent_inverse = tile3d.matrix_parent_inverse.copy()
         self.orig_pos = tile3d.pos
         self.orig_rot = tile3d.rot
+        self.offset = tile3d.pos - Vector(origin) # from the cursor
 
 class Clipboard:
-    def __init__(self, tile3d):
-        self.group = tile3d.group
-        self.pos_offset = tile3d.pos - t3d.cursor.pos
-        self.rot = tile3d.rot
+    # struct-of-arrays, one row per tile
+    # (so transforming the whole clipboard is a few array operations)
+    def __init__(self, tiles, origin):
+        tiles = [tile3d for tile3d in tiles if tile3d.group] # only tiles can be pasted
+        self.groups = [] # tile id -> group name
+        ids = {}
+        size = len(tiles)
+        self.offsets = np.empty((size, 3), dtype=np.int32)
+        self.tile_ids = np.empty(size, dtype=np.int32)
+        self.rots = np.empty(size, dtype=np.float64) # radians
+        for i, tile3d in enumerate(tiles):
+            group = tile3d.group
+            if group not in ids:
+                ids[group] = len(self.groups)
+                self.groups.append(group)
+            self.offsets[i] = tile3d.cell - origin
+            self.tile_ids[i] = ids[group]
+            self.rots[i] = tile3d.rot
+
+    def __len__(self):
+        return len(self.tile_ids)
+
+    def rotate(self, turns=1):
+        # rotate 90 degrees anticlockwise (about the cursor) per turn
+        turns %= 4
+        x = self.offsets[:, 0].copy()
+        y = self.offsets[:, 1].copy()
+        if turns == 1:
+            self.offsets[:, 0], self.offsets[:, 1] = -y, x
+        elif turns == 2:
+            self.offsets[:, 0], self.offsets[:, 1] = -x, -y
+        elif turns == 3:
+            self.offsets[:, 0], self.offsets[:, 1] = y, -x
+        self.rots += turns * pi / 2
+
+    def mirror(self, axis=0):
+        # flip across the cursor along x (0) or y (1)
+        self.offsets[:, axis] *= -1
+        if axis == 0:
+            self.rots = -self.rots
+        else:
+            self.rots = pi - self.rots
+
+    def items(self, origin):
+        # (cell, group, rot) for each tile, relative to origin
+        for offset, tile_id, rot in zip(self.offsets.tolist(), self.tile_ids.tolist(), self.rots.tolist()):
+            yield origin + offset, self.groups[tile_id], rot
 
 class Tile3DFinder:
     def __init__(self, objects=None):
-        self.cached = {}
+        self.layer = t3d.layer
         self.objects = objects or [c for c in t3d.root.children if c.layers[t3d.layer]]
-        size = len(self.objects)
-        self.kd = KDTree(size)
+        self.index = CellIndex()
 
-        for i, obj in enumerate(self.objects):
-            self.kd.insert(obj.pos, i)
-        self.kd.balance()
+        for obj in self.objects:
+            cell = snap(obj.pos, TOLERANCE)
+            if cell is None: continue # not on the grid
+            self.index.add(cell, obj)
 
     def get_tiles_at(self, pos):
-        vec = pos.copy().freeze()
-        if vec in self.cached:
-            return self.cached[vec]
-        else:
-            objs = [self.objects[index] for pos, index, dist in self.kd.find_range(pos, TOLERANCE)]
-            self.cached[vec] = objs
-            return objs
+        # (don't modify the returned list)
+        return self.index.get(pos)
+
+    def get_tiles_in(self, cube_min, cube_max):
+        # (cell, tiles) for every occupied cell in the box
+        return self.index.query(cube_min, cube_max)
 
 class FinderManager:
-    def __init__(self):
+    def __init__(self, stats=None):
         self.finder = None # also need one for each root
         self.invalidated = True
+        self.version = 0 # changes whenever the results of get_tiles_at might
+        self.stats = stats or Stats()
 
-    def get_tiles_at(self, pos):
-        if self.invalidated:
-            self.finder = Tile3DFinder()
+    def get_finder(self):
+        if self.invalidated or self.finder.layer != t3d.layer:
+            self.rebuild()
             self.invalidated = False
-        return self.finder.get_tiles_at(pos)
+        return self.finder
+
+    @traced()
+    def rebuild(self, objects=None):
+        start = perf_counter()
+        self.finder = Tile3DFinder(objects)
+        self.stats.finder_rebuilds += 1
+        self.stats.finder_time = perf_counter() - start
+
+    def get_tiles_at(self, pos):
+        return self.get_finder().get_tiles_at(pos)
+
+    def get_tiles_in(self, cube_min, cube_max):
+        return self.get_finder().get_tiles_in(cube_min, cube_max)
 
     def invalidate(self):
+        if not self.invalidated:
+            self.version += 1
         self.invalidated = True
 
     def reset(self, objects=None):
-        self.finder = Tile3DFinder(objects)
+        self.rebuild(objects)
+        self.version += 1
+
+class Stats:
+    # cheap counters for the HUD
+    def __init__(self):
+        self.created = 0 # this stroke
+        self.deleted = 0
+        self.repaints = 0 # auto-tiled cells, this stroke
+        self.finder_rebuilds = 0
+        self.finder_time = 0.0 # last rebuild, in seconds
+        self.modal_time = 0.0 # last input event
+        self.draw_time = 0.0 # last viewport draw
+
+    def begin_stroke(self):
+        self.created = 0
+        self.deleted = 0
+        self.repaints = 0
 
 class PaintModeState:
     paint = False
@@ -244,13 +269,17 @@ class Tilemap3D:
         self.state = PaintModeState()
         self.select_start_pos = None
         self.grabbed = None
+        self.grab_pivot = None # temporary parent of the grabbed tiles
+        self.grab_rot = 0 # in degrees
         self.clipboard = None
-        self.finder = FinderManager()
+        self.stats = Stats()
+        self.finder = FinderManager(self.stats)
         self.manual_mode = True # hacky
         self.prop = bpy.context.scene.t3d_prop # i would prefer to not use this at all but it makes sense
         self.lastpos = None
         self.select_cube_redraw = False
         self.tilesets = None
+        self.modified = False # tiles created or deleted since last update
 
         # init
         logging.basicConfig(format='T3D: %(levelname)s: %(message)s', level=logging_level)
@@ -278,6 +307,7 @@ class Tilemap3D:
     def set_tile3d(self, tile3d):
         self.cursor.tile3d = tile3d
 
+    @traced()
     def refresh_tilesets(self):
         self.tilesets = {tileset.tileset: Tileset([tile3d.tile3d for tile3d in tileset.tiles], tileset.rules)
                          for tileset in self.prop.tilesets}
@@ -298,6 +328,8 @@ class Tilemap3D:
         logging.debug("initialized root obj")
 
     def on_quit(self):
+        if self.state.grab:
+            self.end_grab(cancel=True)
         self.root[CUSTOM_PROP_LAST_CURSOR] = self.cursor.serialize()
         unsubscribe('refresh_tilesets', self.refresh_tilesets)
         unsubscribe('set_tile3d', self.set_tile3d)
@@ -306,13 +338,65 @@ class Tilemap3D:
         logging.error(msg)
 
     def on_update(self):
-        self.finder.invalidate()
+        # only rebuild the finder if we changed something
+        if self.modified:
+            self.finder.invalidate()
+            self.modified = False
 
     def get_layers_array(self):
         lst = [False] * 20
         lst[self.layer] = True
         return lst
 
+    def align_tiles(self):
+        # snap every child of root to the grid (and 90 degree rotations) in bulk
+        # returns how many moved and the cells (with layer) that have more than one tile
+        children = self.root.children
+        if not children: return 0, []
+        objects = bpy.data.objects
+        n = len(objects)
+        # by identity, names aren't unique across libraries (tiles are named after their group)
+        index = {obj.as_pointer(): i for i, obj in enumerate(objects)}
+        idx = np.array([index[child.as_pointer()] for child in children])
+
+        locations = np.empty(n * 3)
+        rotations = np.empty(n * 3)
+        layers = np.empty(n * 20, dtype=bool)
+        objects.foreach_get('location', locations)
+        objects.foreach_get('rotation_euler', rotations)
+        objects.foreach_get('layers', layers)
+        locations = locations.reshape(n, 3)
+        rotations = rotations.reshape(n, 3)
+
+        loc = locations[idx]
+        loc[:, 2] /= self.tilesize_z
+        cells = np.round(loc).astype(np.int64)
+        new_loc = cells.astype(np.float64)
+        new_loc[:, 2] *= self.tilesize_z
+        rot = rotations[idx, 2]
+        new_rot = np.round(rot / (pi / 2)) * (pi / 2)
+        changed = (np.abs(new_loc - locations[idx]) > 1e-6).any(axis=1)
+        changed |= np.abs(new_rot - rot) > 1e-6
+        count = int(changed.sum())
+
+        # only write root's children (foreach_set would write every object, linked ones too)
+        for i in np.flatnonzero(changed).tolist():
+            obj = children[i]
+            obj.location = new_loc[i]
+            obj.rotation_euler.z = new_rot[i]
+
+        # collisions (only tiles on the same layer can collide)
+        layer = layers.reshape(n, 20)[idx].argmax(axis=1)
+        keys = np.column_stack((cells, layer))
+        keys -= keys.min(axis=0)
+        flat = np.ravel_multi_index(keys.T, keys.max(axis=0) + 1)
+        unique, inverse, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        collided = np.flatnonzero(counts[inverse] > 1)
+        collisions = sorted({(Cell(*cells[i].tolist()), int(layer[i])) for i in collided})
+
+        self.finder.invalidate()
+        return count, collisions
+
     def _get_tiles(self):
         return self.finder.get_tiles_at(self.cursor.pos)
 
@@ -327,24 +411,31 @@ class Tilemap3D:
         self.delete()
         self.create_tile(tile3d)
 
-    def create_tile(self, group):
-        bpy.ops.object.group_instance_add(group=group, layers=self.get_layers_array())
-        tile3d = bpy.context.object
+    @traced()
+    def create_tile(self, group, pos=None, rot=None):
+        # bpy.data rather than bpy.ops.object.group_instance_add (much faster in batches)
+        # (pos and rot default to the cursor, rot in radians)
+        tile3d = bpy.data.objects.new(group, None)
+        tile3d.dupli_type = 'GROUP'
+        tile3d.dupli_group = bpy.data.groups[group]
         tile3d.empty_draw_size = 0.25
-        tile3d.pos = self.cursor.pos
-        tile3d.rot = radians(self.cursor.rot)
+        bpy.context.scene.objects.link(tile3d)
+        tile3d.layers = self.get_layers_array()
+        tile3d.pos = self.cursor.pos if pos is None else pos
+        tile3d.rot = radians(self.cursor.rot) if rot is None else rot
         tile3d.parent = self.root
+        self.modified = True
+        self.stats.created += 1
         logging.debug("created object {}".format(tile3d.name))
         return tile3d
 
     def delete(self, ignore=None):
-        tiles = self._get_tiles()
-        if ignore and ignore in tiles:
-            tiles.remove(ignore)
+        tiles = [tile3d for tile3d in self._get_tiles() if tile3d is not ignore]
         if tiles:
             tile3d = tiles[0] # assume only one
             self.delete_tile(tile3d)
 
+    @traced()
     def delete_tile(self, obj):
         try:
             bpy.data.objects.remove(obj, True)
@@ -353,6 +444,8 @@ class Tilemap3D:
             # might be because finder should have been invalidated
             # might be because drawing routines are dodgey and go over same cell twice
             logging.debug('WARNING: Object deleted twice')
+        self.modified = True
+        self.stats.deleted += 1
         logging.debug("deleted 1 object")
 
     def cdraw(self):
@@ -361,6 +454,7 @@ class Tilemap3D:
         elif self.state.delete:
             self.delete()
 
+    @traced()
     def brush_draw(self):
         if self.prop.brush_size > 1:
             radius = self.prop.brush_size - 1
@@ -371,20 +465,53 @@ class Tilemap3D:
         else:
             self.cdraw()
 
+    def brush_points(self, pos):
+        # cells covered by the brush at pos
+        if self.prop.brush_size > 1:
+            radius = self.prop.brush_size - 1
+            x, y, z = pos
+            if self.prop.outline:
+                return circle_points(radius, x, y, z)
+            return circfill_points(x, y, radius, z)
+        return [pos]
+
+    @traced()
+    def stroke(self, pos):
+        # move the cursor to pos, painting every cell in between
+        # (the mouse can skip cells when moving fast)
+        if self.state.grab or not (self.state.paint or self.state.delete):
+            self.on_move(pos - self.cursor.pos)
+            return
+        x1, y1, z1 = self.cursor.pos
+        x2, y2, z2 = pos
+        cells = [cell for cell in line_points(x1, x2, y1, y2, z1, z2)
+                 if cell != self.cursor.pos]
+        if len(cells) <= 1:
+            self.on_move(pos - self.cursor.pos)
+            return
+        # paint the whole segment as one batch
+        points = []
+        seen = set()
+        for cell in cells:
+            for point in self.brush_points(cell):
+                if point not in seen:
+                    seen.add(point)
+                    points.append(point)
+        self.batch_cdraw(points)
+        self.cursor.pos = pos
+        self.lastpos = self.cursor.pos
+        self.select_cube_redraw = True
+
     def rotate(self, rot):
         # rotate the cursor and paint
         logging.debug("rotated cursor {}".format(rot))
         if self.state.grab:
             mat_rot = Matrix.Rotation(radians(rot), 4, 'Z')
-            for item in self.grabbed:
-                vec = item.tile3d.pos - self.cursor.pos
-                item.tile3d.pos = mat_rot * vec
-                item.tile3d.pos = item.tile3d.pos + self.cursor.pos
-                item.tile3d.rot = item.tile3d.rot + radians(rot)
+            self.grab_rot += rot
+            self.update_grab_pivot()
             if self.state.select:
-                vec = self.select_start_pos - self.cursor.pos
-                self.select_start_pos = mat_rot * vec
-                self.select_start_pos = self.select_start_pos + self.cursor.pos
+                vec = Vector(self.select_start_pos - self.cursor.pos)
+                self.select_start_pos = Cell.from_vector(mat_rot * vec) + self.cursor.pos
                 self.select_cube_redraw = True
         self.cursor.rot = self.cursor.rot + rot
         self.cdraw()
@@ -395,13 +522,12 @@ class Tilemap3D:
         logging.debug("moved cursor {}".format(vec))
         forward = self.cursor.forward
         vec = forward * vec
-        self.on_move(vec)
+        self.on_move(Cell.from_vector(vec))
 
     def on_move(self, vec):
         self.cursor.pos = self.cursor.pos + vec
         if self.state.grab:
-            for item in self.grabbed:
-                item.tile3d.pos = item.tile3d.pos + vec
+            self.update_grab_pivot()
             if self.state.select:
                 self.select_start_pos = self.select_start_pos + vec
         self.lastpos = self.cursor.pos
@@ -425,59 +551,162 @@ class Tilemap3D:
     def start_grab(self):
         if self.state.select:
             tiles = self.get_selected_tiles()
-            if not any(tiles): return
-            for tile3d in tiles:
-                self.grabbed = [GrabData(tile3d) for tile3d in tiles]
         else:
             tile3d = self.get_tile3d()
-            if tile3d is None: return
-            self.grabbed = [GrabData(tile3d)]
+            tiles = [tile3d] if tile3d else []
+        if not tiles: return
+        self.grabbed = [GrabData(tile3d, self.cursor.pos) for tile3d in tiles]
+        # parent everything to a floating empty, so moving is one matrix update
+        self.grab_rot = 0
+        self.grab_pivot = bpy.data.objects.new('T3D_Grab', None)
+        self.grab_pivot.empty_draw_size = 0
+        self.grab_pivot.hide_select = True
+        bpy.context.scene.objects.link(self.grab_pivot)
+        for item in self.grabbed:
+            tile3d = item.tile3d
+            tile3d.parent = self.grab_pivot
+            tile3d.matrix_parent_inverse.identity()
+            tile3d.pos = item.offset
+        self.update_grab_pivot()
         self.state.grab = True
+        # the grabbed tiles aren't root's children now, so they're out of the index
+        # (moving the pivot doesn't change the index, only start and end do)
+        self.modified = True
+        self.finder.invalidate()
         logging.debug("start grab")
 
+    def update_grab_pivot(self):
+        pos = Vector(self.cursor.pos)
+        pos.z *= self.tilesize_z
+        mat_trans = Matrix.Translation(pos)
+        mat_rot = Matrix.Rotation(radians(self.grab_rot), 4, 'Z')
+        self.grab_pivot.matrix_world = self.root.matrix_world * mat_trans * mat_rot
+
     def end_grab(self, cancel=False):
         logging.debug("end grab")
         self.state.grab = False
+        self.modified = True
         if self.state.select:
             self.end_select()
         if cancel:
             for item in self.grabbed:
-                item.tile3d.pos = item.orig_pos
-                item.tile3d.rot = item.orig_rot
+                self.drop_grabbed(item, item.orig_pos, item.orig_rot)
         else:
-            orig_pos = self.cursor.pos
-            for item in self.grabbed:
-                self.cursor.pos = item.tile3d.pos
-                self.delete(ignore=item.tile3d)
-            self.cursor.pos = orig_pos
+            # merge back into the grid in one go
+            mat_rot = Matrix.Rotation(radians(self.grab_rot), 4, 'Z')
+            center = Vector(self.cursor.pos)
+            targets = [(item, mat_rot * item.offset + center) for item in self.grabbed]
+            # whatever is already there gets deleted
+            # (look it up before dropping, while the grabbed tiles are still out of the index)
+            grabbed = {item.tile3d for item in self.grabbed}
+            tiles = {tile3d for item, pos in targets for tile3d in self.finder.get_tiles_at(Cell.from_vector(pos))
+                     if tile3d not in grabbed}
+            for item, pos in targets:
+                self.drop_grabbed(item, pos, item.orig_rot + radians(self.grab_rot))
+            for tile3d in tiles:
+                self.delete_tile(tile3d)
+        self.finder.invalidate()
+        bpy.data.objects.remove(self.grab_pivot, True)
+        self.grab_pivot = None
         self.grabbed = None
 
+    def drop_grabbed(self, item, pos, rot):
+        tile3d = item.tile3d
+        tile3d.parent = item.orig_parent
+        tile3d.matrix_parent_inverse = item.orig_parent_inverse
+        tile3d.pos = pos
+        tile3d.rot = rot
+
     def copy(self):
         if self.state.select:
             tiles = self.get_selected_tiles()
-            if any(tiles):
-                self.clipboard = [Clipboard(tile3d) for tile3d in tiles]
-            else:
-                self.clipboard = None
             self.end_select()
         else:
             tile3d = self.get_tile3d()
-            if tile3d:
-                self.clipboard = [Clipboard(tile3d)]
-            else:
-                self.clipboard = None
+            tiles = [tile3d] if tile3d else []
+        self.clipboard = Clipboard(tiles, self.cursor.pos) if tiles else None
+        if self.clipboard is not None and not len(self.clipboard):
+            self.clipboard = None
         text = len(self.clipboard) if self.clipboard else "0"
         logging.debug("copied {} objects to clipboard".format(text))
 
     def paste(self):
         if self.clipboard:
-            for item in self.clipboard:
-                pos = self.cursor.pos + item.pos_offset
-                rot = degrees(item.rot)
-                cursor = Cursor(item.group, pos, rot)
-                self.do_with_cursor(cursor, self.paint)
+            # one diff: clear the target cells, then create everything
+            items = list(self.clipboard.items(self.cursor.pos))
+            self.batch_delete([cell for cell, group, rot in items])
+            for cell, group, rot in items:
+                self.create_tile(group, cell, rot)
         logging.debug("pasted {} objects".format(len(self.clipboard) if self.clipboard else "0"))
 
+    def rotate_clipboard(self, turns=1):
+        if self.clipboard:
+            self.clipboard.rotate(turns)
+
+    def mirror_clipboard(self, axis=0):
+        if self.clipboard:
+            self.clipboard.mirror(axis)
+
+    def flood_fill(self, dims=2, replace=False):
+        # fill the empty region around the cursor (bounded by tiles),
+        # or with replace, repaint the tiles connected to the one under the cursor
+        start = self.cursor.pos
+        index = self.finder.get_finder().index
+        neighbours = ADJACENCY_2D if dims == 2 else ADJACENCY
+        cube_min = cube_max = None
+        walls = False
+        if replace:
+            tiles = index.get(start)
+            if not tiles: return 0
+            group = tiles[0].group
+            def passable(cell):
+                tiles = index.get(cell)
+                return bool(tiles) and tiles[0].group == group
+        else:
+            if self.state.select:
+                # the selection box is a wall, fill inside it
+                cube_min, cube_max = self.select_cube_bounds()
+                walls = True
+            else:
+                if not len(index): return 0
+                cube_min, cube_max = index.bounds()
+            if dims == 2:
+                cube_min = cube_min._replace(z=start.z)
+                cube_max = cube_max._replace(z=start.z)
+            def passable(cell):
+                return cell not in index
+        try:
+            cells = flood(start, passable, neighbours, cube_min, cube_max, MAX_FILL, walls)
+        except FloodLimitError:
+            self.error('Fill region is too large (more than {} cells)'.format(MAX_FILL))
+            return 0
+        if cells is None:
+            self.error('Fill region is not enclosed')
+            return 0
+        state = self.state.paint
+        self.state.paint = True
+        self.batch_cdraw(cells)
+        self.state.paint = state
+        logging.debug("filled {} cells".format(len(cells)))
+        return len(cells)
+
+    def get_connected_tiles(self, dims=3):
+        # tiles touching the tile under the cursor (and touching those...)
+        index = self.finder.get_finder().index
+        neighbours = ADJACENCY_2D if dims == 2 else ADJACENCY
+        try:
+            cells = flood(self.cursor.pos, index.__contains__, neighbours, limit=MAX_FILL)
+        except FloodLimitError:
+            self.error('Too many connected tiles (more than {})'.format(MAX_FILL))
+            return []
+        return [tile3d for cell in cells for tile3d in index.get(cell)]
+
+    def select_connected(self, dims=3):
+        tiles = self.get_connected_tiles(dims)
+        for tile3d in tiles:
+            tile3d.select = True
+        return len(tiles)
+
     def do_with_cursor(self, cursor, func, *args, **kw):
         orig = self.cursor
         self.cursor = cursor
@@ -491,45 +720,60 @@ class Tilemap3D:
 
     def end_select(self):
         logging.debug("end box select")
-        points = self.region_points()
+        if self.state.delete:
+            # only visit the cells that have something to delete
+            points = self.get_selected_cells()
+        else:
+            points = self.region_points()
         self.batch_cdraw(points)
         self.state.select = False
         self.select_cube_redraw = True
 
     def get_selected_tiles(self):
         # get tiles within selection bounds
-        points = self.region_points()
-        tiles = []
-        def get_tiles(tiles):
-            tile3d = t3d.get_tile3d()
-            if tile3d:
-                tiles.append(tile3d)
-        self.do_points(points, get_tiles, tiles)
-        return tiles
+        cube_min, cube_max = self.select_cube_bounds()
+        return [tile3d for cell, tiles in self.finder.get_tiles_in(cube_min, cube_max)
+                for tile3d in tiles]
+
+    def get_selected_cells(self):
+        # occupied cells within selection bounds
+        cube_min, cube_max = self.select_cube_bounds()
+        return [cell for cell, tiles in self.finder.get_tiles_in(cube_min, cube_max)]
 
     def region_points(self):
+        # (lazy, use get_selected_cells if only want occupied cells)
         cube_min, cube_max = self.select_cube_bounds()
-        return [Vector((cube_min.x + x, cube_min.y + y, cube_min.z + z))
-                for x in range(int(round(abs(cube_max.x + 1 - cube_min.x))))
-                for y in range(int(round(abs(cube_max.y + 1 - cube_min.y))))
-                for z in range(int(round(abs(cube_max.z + 1 - cube_min.z))))]
+        return iter_region(cube_min, cube_max)
 
     def select_cube_bounds(self):
-        start = self.select_start_pos
-        end = self.cursor.pos
-        cube_min = Vector((min(start.x, end.x), min(start.y, end.y), min(start.z, end.z)))
-        cube_max = Vector((max(start.x, end.x), max(start.y, end.y), max(start.z, end.z)))
-        return cube_min, cube_max
+        return bounds(self.select_start_pos, self.cursor.pos)
 
     def select_cube_dim(self):
         cube_min, cube_max = self.select_cube_bounds()
-        w = int(round(abs(cube_max.x + 1 - cube_min.x)))
-        d = int(round(abs(cube_max.y + 1 - cube_min.y)))
-        h = int(round(abs(cube_max.z + 1 - cube_min.z)))
+        w = cube_max.x + 1 - cube_min.x
+        d = cube_max.y + 1 - cube_min.y
+        h = cube_max.z + 1 - cube_min.z
         return w, d, h
 
+    @traced()
     def batch_cdraw(self, points):
-        self.do_points(points, self.cdraw)
+        if self.state.paint:
+            self.batch_paint(points)
+        elif self.state.delete:
+            self.batch_delete(points)
+
+    def batch_paint(self, points):
+        tile3d = self.cursor.tile3d
+        if not tile3d: return
+        points = list(points)
+        self.batch_delete(points)
+        self.do_points(points, self.create_tile, tile3d)
+
+    def batch_delete(self, points):
+        # look everything up before deleting anything, then delete in one go
+        tiles = {tile3d for pos in points for tile3d in self.finder.get_tiles_at(pos)}
+        for tile3d in tiles:
+            self.delete_tile(tile3d)
 
     def do_points(self, points, func, *args, **kw):
         # do func for each point in points
@@ -540,8 +784,7 @@ class Tilemap3D:
         self.cursor.pos = orig_pos
 
     def _goto(self, x, y):
-        self.cursor.pos.x = x
-        self.cursor.pos.y = y
+        self.cursor.pos = Cell(int(x), int(y), self.cursor.pos.z)
         self.select_cube_redraw = True
 
     def plot(self, x, y):
@@ -570,104 +813,3 @@ class Tilemap3D:
         points = line_points(x1, x2, y1, y2, z)
         self.batch_cdraw(points)
         self._goto(x2,y2)
-
-def circle_points(radius, x0, y0, z):
-    x = radius
-    y = 0
-    err = 0
-    points = []
-    while x >= y:
-        points += [
-            Vector((x0 + x, y0 + y, z)).freeze(),
-            Vector((x0 + y, y0 + x, z)).freeze(),
-            Vector((x0 - y, y0 + x, z)).freeze(),
-            Vector((x0 - x, y0 + y, z)).freeze(),
-            Vector((x0 - x, y0 - y, z)).freeze(),
-            Vector((x0 - y, y0 - x, z)).freeze(),
-            Vector((x0 + y, y0 - x, z)).freeze(),
-            Vector((x0 + x, y0 - y, z)).freeze()
-        ]
-
-        y += 1
-        if err <= 0:
-            err += 2 * y + 1
-        if err > 0:
-            x -= 1
-            err -= 2 * x + 1
-    points = list(set(points)) # remove duplicates...
-    return points
-
-def plot4(cx, cy, x, y, z):
-    cx = int(cx)
-    cy = int(cy)
-    x = int(x)
-    y = int(y)
-
-    points = line_points(cx - x, cx + x, cy + y, cy + y, z)
-    if x != 0 and y != 0:
-        points += line_points(cx - x, cx + x, cy - y, cy - y, z)
-    return points
-
-def circfill_points(cx, cy, radius, z):
-    x = radius
-    y = 0
-    err = -radius
-    points = []
-    while y <= x:
-        lasty = y
-        err += y
-        y += 1
-        err += y
-        points += plot4(cx, cy, x, lasty, z)
-        if err > 0:
-            if x != lasty:
-                points += plot4(cx, cy, lasty, x, z)
-            err -= x
-            x -= 1
-            err -= x
-    return points
-
-def line_points(x1, x2, y1, y2, z):
-    points = []
-    dx = x2 - x1
-    dy = y2 - y1
-    if dx == 0:
-        step = 1 if dy > 0 else -1
-        for y in range(y1, y2 + step, step):
-            points.append(Vector((x1, y, z)))
-    elif dy == 0:
-        step = 1 if dx > 0 else -1
-        for x in range(x1, x2 + step, step):
-            points.append(Vector((x, y1, z)))
-    else:
-        if dy < 0:
-            dy = -dy
-            stepy = -1
-        else:
-            stepy = 1
-
-        if dx < 0:
-            dx = -dx
-            stepx = -1
-        else:
-            stepx = 1
-
-        if dx > dy:
-            frac = dy - (dx >> 1)
-            while x1 != x2:
-                if frac >= 0:
-                    y1 = y1 + stepy
-                    frac = frac - dx
-                x1 = x1 + stepx
-                frac = frac + dy
-                points.append(Vector((x1, y1, z)))
-        else:
-            frac = dx - (dy >> 1)
-            while y1 != y2:
-                if frac >= 0:
-                    x1 = x1 + stepx
-                    frac = frac - dy
-                y1 = y1 + stepy
-                frac = frac + dx
-                points.append(Vector((x1, y1, z)))
-    return points
\ No newline at end of file
@@ -0,0 +1,98 @@
+
+# chrome trace recording (open in chrome://tracing or ui.perfetto.dev)
+# off by default, and costs one flag check per span when off
+# set T3D_TRACE=path/to/trace.json to record a whole session (e.g. headless jobs)
+
+import os
+import json
+import atexit
+import threading
+from time import perf_counter
+from functools import wraps
+
+ENV_VAR = 'T3D_TRACE'
+
+enabled = False
+trace_events = []
+_start = perf_counter()
+
+def enable():
+    global enabled
+    trace_events.clear()
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def now():
+    return (perf_counter() - _start) * 1e6 # microseconds
+
+class Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        event = {
+            'name': self.name,
+            'ph': 'X',
+            'ts': self.start,
+            'dur': now() - self.start,
+            'pid': os.getpid(),
+            'tid': threading.get_ident()
+        }
+        if self.args:
+            event['args'] = self.args
+        trace_events.append(event)
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def span(name, args=None):
+    # with span('name'): ...
+    if not enabled: return NULL_SPAN
+    return Span(name, args)
+
+def traced(name=None):
+    # decorator, records a span for every call
+    def decorator(func):
+        span_name = name or func.__qualname__
+        @wraps(func)
+        def wrap(*args, **kw):
+            if not enabled:
+                return func(*args, **kw)
+            with Span(span_name, None):
+                return func(*args, **kw)
+        return wrap
+    return decorator
+
+def save(path):
+    data = {'traceEvents': list(trace_events), 'displayTimeUnit': 'ms'}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+    return len(data['traceEvents'])
+
+def _save_at_exit(path):
+    if trace_events:
+        save(path)
+
+if os.environ.get(ENV_VAR):
+    enable()
+    atexit.register(_save_at_exit, os.path.abspath(os.environ[ENV_VAR]))
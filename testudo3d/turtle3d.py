@@ -1,7 +1,7 @@
 
 import logging
 import bpy
-from .tilemap3d import Tilemap3D, round_vector
+from .tilemap3d import Tilemap3D, Cell
 from .autotiler3d import AutoTiler3D
 from mathutils import Matrix, Vector
 
@@ -12,8 +12,9 @@ def invalidate(func):
     # it's not very smart but it's simple
     # todo touch() and touched[], if cell touched then invalidate
     def wrap(*args, **kw):
-        func(*args, **kw)
+        result = func(*args, **kw)
         t3d.finder.invalidate()
+        return result
     return wrap
 
 class Turtle3D:
@@ -49,6 +50,12 @@ class Turtle3D:
     def paste(self):
         t3d.paste()
 
+    def rotate_clipboard(self, turns=1):
+        t3d.rotate_clipboard(turns)
+
+    def mirror_clipboard(self, axis=0):
+        t3d.mirror_clipboard(axis)
+
     def start_select(self):
         t3d.start_select()
 
@@ -79,14 +86,14 @@ class Turtle3D:
     @invalidate
     def goto(self, x, y, z=None):
         z = z if z is not None else t3d.cursor.pos.z
-        vec = Vector((x, y, z)) - t3d.cursor.pos
+        vec = Cell.from_vector((x, y, z)) - t3d.cursor.pos
         t3d.on_move(vec)
 
     @invalidate
     def forward(self, i):
         vec = Vector((0, i, 0))
         forward = t3d.cursor.forward
-        vec = t3d.cursor.pos + forward * vec
+        vec = Vector(t3d.cursor.pos) + forward * vec
         t3d.line(vec.x, vec.y)
 
     @invalidate
@@ -107,12 +114,12 @@ class Turtle3D:
 
     @invalidate
     def setx(self, x):
-        t3d.cursor.pos.x = x
+        t3d.cursor.pos = t3d.cursor.pos._replace(x=int(x))
         t3d.select_cube_redraw = True
 
     @invalidate
     def sety(self, y):
-        t3d.cursor.pos.y = y
+        t3d.cursor.pos = t3d.cursor.pos._replace(y=int(y))
         t3d.select_cube_redraw = True
 
     def getx(self):
@@ -153,7 +160,8 @@ class Turtle3D:
         self.setheading(0)
 
     def position(self):
-        return t3d.cursor.pos
+        # (a Vector, like before the cursor used Cell)
+        return Vector(t3d.cursor.pos)
 
     def heading(self):
         return t3d.cursor.rot
@@ -178,6 +186,14 @@ class Turtle3D:
         t3d.end_select()
         t3d.state.paint = state
 
+    @invalidate
+    def floodfill(self, dims=2):
+        return t3d.flood_fill(dims)
+
+    @invalidate
+    def fillreplace(self):
+        return t3d.flood_fill(3, replace=True)
+
     @invalidate
     def clear(self):
         state = t3d.state.delete
@@ -0,0 +1,96 @@
+# small helpers that don't need the rest of t3d
+# (the add-on imports these at register time, keep it cheap)
+
+import bpy
+from mathutils import Vector
+from bpy.props import StringProperty
+from .grid import Cell
+
+CUSTOM_PROP_TILE_SIZE_Z = "t3d_tile_size_z" # on the root
+
+def clamp(a, b, c):
+    return max(b, min(a, c))
+
+def roundbase(x, base):
+    return int(base * round(float(x)/base))
+
+def round_vector(vec):
+    # (only for vectors coming from blender, use Cell inside t3d)
+    vec.x = round(vec.x)
+    vec.y = round(vec.y)
+    vec.z = round(vec.z)
+
+def update_3dviews():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                area.tag_redraw()
+
+def get_first_group_name(obj):
+    if len(obj.users_group) > 0:
+        return obj.users_group[0].name
+
+def get_tileset_from_group(group_name):
+    src = bpy.data.objects[group_name]
+    return src.tileset
+
+def get_tile_cell(obj):
+    # the cell of a tile from its root, without t3d (same as obj.cell)
+    root = obj.parent
+    tilesize_z = root.get(CUSTOM_PROP_TILE_SIZE_Z, 1.0) if root else 1.0
+    vec = obj.location.copy()
+    vec.z /= tilesize_z
+    return Cell.from_vector(vec)
+
+def init_object_props():
+    def get_pos(self):
+        vec = self.location.copy()
+        vec.z /= t3d.tilesize_z
+        return vec
+
+    def set_pos(self, vec):
+        vec = Vector(vec)
+        vec.z *= t3d.tilesize_z
+        self.location = vec
+
+    def get_cell(self):
+        return Cell.from_vector(self.pos)
+
+    def get_rot(self):
+        return self.rotation_euler.z
+
+    def set_rot(self, rot):
+        self.rotation_euler.z = rot
+
+    def get_group(self):
+        if self.dupli_group:
+            return self.dupli_group.name
+
+    def get_tileset(self):
+        if self.dupli_group:
+            return get_tileset_from_group(self.dupli_group.name)
+
+    def is_src_tile(self):
+        name = self.name
+        if name not in bpy.data.groups: return False
+        group = bpy.data.groups[name]
+        if name not in group.objects: return False
+        if not self.tileset: return False
+        return True
+
+    def is_tile(self):
+        if not self.dupli_group: return False
+        name = self.dupli_group.name
+        if name not in self.dupli_group.objects: return False
+        src = self.dupli_group.objects[name]
+        if not src.tileset: return False
+        return True
+
+    # NOTE: these attribute names may conflict with other addons
+    bpy.types.Object.pos = property(get_pos, set_pos)
+    bpy.types.Object.cell = property(get_cell)
+    bpy.types.Object.rot = property(get_rot, set_rot)
+    bpy.types.Object.group = property(get_group)
+    bpy.types.Object.src_tileset = property(get_tileset)
+    bpy.types.Object.tileset = StringProperty(name='Tileset')
+    bpy.types.Object.is_src_tile = property(is_src_tile)